@@ -0,0 +1,48 @@
+from collections import namedtuple
+
+from home.versioned_cache import VersionedCache
+
+VERSION_KEY = 'home:ancestors:version'
+HERO_RENDITION = 'fill-1920x400-c80'
+
+Ancestor = namedtuple('Ancestor', 'id title url image_url')
+
+
+def build_ancestors(page, site):
+    '''Ancestor tuples for a page, root first and the page itself last,
+    leaving out the tree root. Hero image renditions are resolved here.'''
+    from home.utils import specific_pages
+    from wagtail.wagtailcore.models import Page
+
+    pages = specific_pages(list(
+        Page.objects.ancestor_of(page, inclusive=True).filter(depth__gt=1)))
+    ancestors = []
+    for ancestor in pages:
+        image = getattr(ancestor, 'image', None)
+        ancestors.append(Ancestor(
+            id=ancestor.pk,
+            title=ancestor.title,
+            url=ancestor.relative_url(site) if site else ancestor.url,
+            image_url=image.get_rendition(HERO_RENDITION).url if image else None))
+    return tuple(ancestors)
+
+
+class AncestorCache(VersionedCache):
+    '''Process local map of (site, tree path) to ancestor tuples. Publish,
+    unpublish, move and delete bump the shared version.'''
+
+    version_key = VERSION_KEY
+    interval_setting = 'ANCESTOR_CACHE_CHECK_INTERVAL'
+
+    def get(self, page, site=None):
+        return self.fetch(
+            (site.pk if site else None, page.path),
+            lambda: build_ancestors(page, site))
+
+
+ancestor_cache = AncestorCache()
+
+
+def bump_ancestor_version(*args, **kwargs):
+    '''Signal handler for changes that affect the page tree.'''
+    ancestor_cache.bump()
@@ -0,0 +1,34 @@
+from __future__ import unicode_literals
+
+from django.apps import AppConfig
+from django.db.models.signals import post_delete, post_save
+from wagtail.wagtailcore.signals import page_published, page_unpublished
+
+
+class HomeConfig(AppConfig):
+    '''Config method for naming app and registering signals.'''
+    name = 'home'
+
+    def ready(self):
+        from wagtail.wagtailcore.models import Page
+        from home.models import AboutFooter, BlogPage, Copyright, Logo, \
+            Social, store_blog_intro
+        from home.ancestors import bump_ancestor_version
+        from home.render_cache import invalidate_rendered_body
+        from home.snippets import bump_snippet_version
+
+        page_published.connect(store_blog_intro, sender=BlogPage)
+        page_published.connect(invalidate_rendered_body, sender=BlogPage)
+        page_unpublished.connect(invalidate_rendered_body, sender=BlogPage)
+
+        # Only changes to the live tree touch ancestors. Draft revisions
+        # save the specific page and are ignored; a move saves the page as
+        # a base Page, and deleting any page deletes its Page row.
+        page_published.connect(bump_ancestor_version)
+        page_unpublished.connect(bump_ancestor_version)
+        post_save.connect(bump_ancestor_version, sender=Page)
+        post_delete.connect(bump_ancestor_version, sender=Page)
+
+        for snippet in (Social, Copyright, AboutFooter, Logo):
+            post_save.connect(bump_snippet_version, sender=snippet)
+            post_delete.connect(bump_snippet_version, sender=snippet)
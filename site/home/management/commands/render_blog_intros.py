@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from home.models import BlogPage
+
+
+class Command(BaseCommand):
+    help = ('Render and store the listing intro of every blog page that '
+            'hasn\'t been published since intros were stored.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Re-render pages that already have a stored intro.')
+
+    def handle(self, *args, **options):
+        pages = BlogPage.objects.order_by('pk')
+        if not options['all']:
+            pages = pages.filter(intro_html__isnull=True)
+        count = 0
+        for page in pages.iterator():
+            page.store_intro()
+            count += 1
+        self.stdout.write('Rendered %d blog intros' % count)
@@ -2,11 +2,14 @@ from __future__ import absolute_import, unicode_literals
 
 from collections import OrderedDict
 
-from itertools import chain
-from operator import attrgetter
 from datetime import date
 
+from django.contrib.contenttypes.models import ContentType
 from django.db import models
+from django.db.models import Prefetch
+from django.db.models.functions import Coalesce
+from django.utils.encoding import force_text
+from django.utils.functional import cached_property
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
 from django import forms
 
@@ -29,6 +32,9 @@ from wagtail.contrib.table_block.blocks import TableBlock
 from modelcluster.fields import ParentalKey
 from wagtailmenus.models import MenuPage
 
+from home.utils import media_items_for, set_listing_urls, specific_pages
+from venues.hours import parse_open_at
+
 
 # Maybe TODO: Implement tagging. Not sure for what reason, might just be a nice way to filter for relevant information
 # TODO: Map the heirachy of the entire site to lock down unnecessary page options when creating.
@@ -237,13 +243,36 @@ class LinkFieldsUrlImage(LinkFieldUrl, LinkFieldImage):
         abstract = True
 
 
+EMBED_PROVIDERS = ('youtube', 'soundcloud', 'vimeo')
+
+
+def embed_provider(url):
+    '''Name of the supported embed site serving a url, or an empty string.'''
+    url_split = url.split('.')
+    for provider in EMBED_PROVIDERS:
+        if provider in url_split:
+            return provider
+    return ''
+
+
 class BlogPageMediaItem(LinkFieldsUrlImage):
     page = ParentalKey('home.BlogPage', related_name='media_item')
+    provider = models.CharField(max_length=20, blank=True, editable=False)
+
+    def save(self, *args, **kwargs):
+        self.provider = embed_provider(self.link_external)
+        return super(BlogPageMediaItem, self).save(*args, **kwargs)
 
 
 class BlogPage(Page):
     body = StreamField(HomeStreamBlock())
     date = models.DateField("Post date", default=date.today)
+    # Rendered from the body's intro blocks when the page is published.
+    # None means not rendered yet, which render_blog_intros backfills.
+    intro_html = models.TextField(null=True, blank=True, editable=False)
+
+    # Listings only need the stored intro, never the full body.
+    listing_defer = ['body']
 
     parent_page_types = [
         'home.SeasonPage',
@@ -251,17 +280,25 @@ class BlogPage(Page):
         'home.AboutPage'
     ]
 
-    @property
-    def intro(self):
-        intro = []
-        for block in self.body:
-            if block.block_type == 'intro':
-                intro.append(block)
-        return intro
+    def render_intro(self):
+        return ''.join(
+            force_text(block) for block in self.body
+            if block.block_type == 'intro')
+
+    def store_intro(self):
+        '''Render the intro and store it without a full save.'''
+        self.intro_html = self.render_intro()
+        BlogPage.objects.filter(pk=self.pk).update(intro_html=self.intro_html)
 
     class Meta:
         verbose_name = "Blog Page"
 
+
+def store_blog_intro(sender, instance, **kwargs):
+    '''Signal handler for BlogPage publishes. The published instance
+    carries the revision's body, so drafts never touch the stored intro.'''
+    instance.store_intro()
+
 BlogPage.content_panels = [
     FieldPanel('title', classname='full title'),
     FieldPanel('date'),
@@ -302,7 +339,7 @@ class BlogIndexPage(MenuPage):
 
     @property
     def blogs(self):
-        blogs = BlogPage.objects.live().child_of(self)
+        blogs = BlogPage.objects.live().child_of(self).defer('body')
         blogs = blogs.order_by('-date')
         return blogs
 
@@ -318,24 +355,34 @@ class BlogIndexPage(MenuPage):
         documents = documents.order_by('-date')
         return documents
 
-    def get_context(self, request):   
-        results = sorted(
-            chain(self.blogs, self.documents, self.indexes),
-            key=attrgetter('date')
-        )
+    @property
+    def listing(self):
+        '''Live blog, document and index children merged and ordered by
+        date in the database, so only the requested page is loaded.'''
+        content_types = ContentType.objects.get_for_models(
+            BlogPage, DocumentPage, BlogIndexPage).values()
+        listing = Page.objects.live().child_of(self).filter(
+            content_type__in=content_types)
+        listing = listing.annotate(sort_date=Coalesce(
+            'blogpage__date', 'documentpage__date', 'blogindexpage__date'))
+        return listing.order_by('sort_date', 'pk')
 
+    def get_context(self, request):
         # Pagination
         page = request.GET.get('page')
-        paginator = Paginator(results, 10)  # Show 10 blogs per page
+        paginator = Paginator(self.listing, 10)  # Show 10 blogs per page
         try:
             blogs = paginator.page(page)
         except PageNotAnInteger:
             blogs = paginator.page(1)
         except EmptyPage:
             blogs = paginator.page(paginator.num_pages)
+        blogs.object_list = set_listing_urls(
+            specific_pages(blogs.object_list), getattr(request, 'site', None))
 
         context = super(BlogIndexPage, self).get_context(request)
         context['paginator'] = blogs
+        context['media_items'] = media_items_for(blogs.object_list)
         return context
 
     class Meta:
@@ -613,9 +660,26 @@ class SeasonPage(Page):
     def news_index(self):
         return BlogIndexPage.objects.live().child_of(self).first()
 
-    @property
-    def primary_news(self):
-        return BlogPage.objects.live().child_of(self.news_index()).order_by('latest_revision_created_at').first()
+    def get_context(self, request):
+        '''Load everything the season template needs up front: the news
+        item with its link page, the four latest posts and their media
+        items, and the competitions, with card URLs from one read of the
+        site root paths. That is a fixed number of queries however many
+        competitions or posts there are.'''
+        news_item = self.news_item.select_related('link_page').first()
+        news = []
+        if news_item and news_item._check_page_type():
+            news = list(news_item.news()[:4])
+            set_listing_urls(
+                news + [news_item.link_page], getattr(request, 'site', None))
+
+        context = super(SeasonPage, self).get_context(request)
+        context['news_item'] = news_item
+        context['primary_news'] = news[:1]
+        context['secondary_news'] = news[1:]
+        context['media_items'] = media_items_for(news)
+        context['competitions'] = list(self.competitions.all())
+        return context
 
     class Meta:
         verbose_name = "Season Page"
@@ -641,18 +705,49 @@ class VenuePage(Page):
     of the new season centric layout of the website.'''
     blurb = models.CharField(max_length=500, blank=True)
 
-    @property
+    # Listing cards show the address alongside the blurb.
+    listing_related = ['venue_details']
+
+    def _prefetched(self, name):
+        '''Whether the venue details relation was loaded by listing().'''
+        cache = getattr(self.venue_details, '_prefetched_objects_cache', {})
+        return name in cache
+
+    @cached_property
     def photos(self):
-        return self.venue_details.photos.all().order_by('-photo')
+        if self._prefetched('photos'):
+            return list(reversed(self.venue_details.photos.all()))
+        # The gallery renders a srcset per format for every photo.
+        return list(self.venue_details.photos.order_by(
+            '-photo').prefetch_related('variants'))
 
     @property
     def photo(self):
+        if self._prefetched('photos'):
+            return self.venue_details.photos.all()[0]
         return self.venue_details.photos.all().order_by('photo')[0]
 
     @property
     def open_hours(self):
+        if self._prefetched('openhours'):
+            return self.venue_details.openhours.all()
         return self.venue_details.openhours.all().order_by('open_day')
 
+    @classmethod
+    def listing(cls, queryset):
+        '''Load the details, ordered hours and photos with their variants
+        for a queryset of venues in a fixed number of queries.'''
+        from venues.models import OpenHours, VenueImage
+
+        return queryset.select_related('venue_details').prefetch_related(
+            Prefetch(
+                'venue_details__openhours',
+                queryset=OpenHours.objects.order_by('open_day')),
+            Prefetch(
+                'venue_details__photos',
+                queryset=VenueImage.objects.order_by(
+                    'photo').prefetch_related('variants')))
+
     class Meta:
         verbose_name = "Venue Page"
     
@@ -673,13 +768,26 @@ class VenueIndexPage(Page):
 
     @property
     def venues(self):
-        venues = VenuePage.objects.live().child_of(self)
+        # Venues are listed once the worker has filled in their details.
+        venues = VenuePage.objects.live().child_of(self).filter(
+            venue_details__isnull=False)
 
-        venues = venues.order_by('title')
+        venues = VenuePage.listing(venues.order_by('title'))
         return venues
 
+    def open_venues(self, minute):
+        '''Venues open at a minute of the week, see venues.hours.'''
+        return self.venues.filter(
+            venue_details__open_intervals__start__lte=minute,
+            venue_details__open_intervals__end__gt=minute).distinct()
+
     def get_context(self, request):
         venues = self.venues
+        open_at = request.GET.get('open')
+        if open_at:
+            minute = parse_open_at(open_at)
+            if minute is not None:
+                venues = self.open_venues(minute)
 
         # Pagination
         page = request.GET.get('page')
@@ -691,6 +799,9 @@ class VenueIndexPage(Page):
         except EmptyPage:
             venues = paginator.page(paginator.num_pages)
 
+        venues.object_list = set_listing_urls(
+            list(venues.object_list), getattr(request, 'site', None))
+
         context = super(VenueIndexPage, self).get_context(request)
         context['paginator'] = venues
         return context
@@ -712,18 +823,23 @@ class NewsItem(LinkFieldPage):
     page = ParentalKey('home.SeasonPage', related_name='news_item')
 
     def _check_page_type(self):
-        if self.link_page.content_type.model == 'blogindexpage':
+        # Content types are cached by Django, so this needs no query.
+        blog_index = ContentType.objects.get_for_model(BlogIndexPage)
+        if self.link_page and self.link_page.content_type_id == blog_index.pk:
             return True
         else:
             return False
 
+    def news(self):
+        return BlogPage.objects.live().child_of(self.link_page).defer('body').order_by('-date')
+
     def primary(self):
         if self._check_page_type():
-            return BlogPage.objects.live().child_of(self.link_page).order_by('-date')[0:1]
+            return self.news()[0:1]
 
     def secondary(self):
         if self._check_page_type():
-            return BlogPage.objects.live().child_of(self.link_page).order_by('-date')[1:4] 
+            return self.news()[1:4]
     # if doc page type is blogpageindex
     # get primary news item
     # get three secondary news items
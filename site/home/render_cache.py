@@ -0,0 +1,79 @@
+import threading
+
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+REVISION_KEY = 'home:render:revision:%s'
+BODY_KEY = 'home:render:body:%s:%s'
+WEEK = 60 * 60 * 24 * 7
+
+_stats = {'hits': 0, 'misses': 0}
+_stats_lock = threading.Lock()
+
+
+def _count(name):
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def stats():
+    '''Hits and misses of this process since it started.'''
+    with _stats_lock:
+        return dict(_stats)
+
+
+def revision_token(page):
+    '''The live revision recorded when the page was last published, or the
+    page's latest revision time for pages published before the cache.'''
+    token = cache.get(REVISION_KEY % page.pk)
+    if token is None and page.latest_revision_created_at:
+        token = page.latest_revision_created_at.isoformat()
+    return token
+
+
+def render_blocks(page):
+    return [
+        render_to_string(
+            'home/includes/streamfield_block.html', {'child': child})
+        for child in page.body]
+
+
+def get_rendered_body(page):
+    '''Rendered StreamField HTML for a live page, with the fragment for
+    each block. Entries are shared between processes through the cache
+    and keyed by the page's live revision.'''
+    key = BODY_KEY % (page.pk, revision_token(page))
+    rendered = cache.get(key)
+    if rendered is not None:
+        _count('hits')
+        return rendered
+
+    _count('misses')
+    blocks = render_blocks(page)
+    rendered = {
+        'html': '<div class="stream-field">%s</div>' % ''.join(blocks),
+        'blocks': blocks,
+    }
+    cache.set(key, rendered, getattr(settings, 'RENDER_CACHE_TIMEOUT', WEEK))
+    return rendered
+
+
+def render_body(page, preview=False):
+    '''Rendered body HTML. Previews show unpublished content, so they are
+    rendered directly and never touch the cache.'''
+    if preview:
+        return mark_safe('<div class="stream-field">%s</div>' % ''.join(
+            render_blocks(page)))
+    return mark_safe(get_rendered_body(page)['html'])
+
+
+def invalidate_rendered_body(sender, instance, revision=None, **kwargs):
+    '''Signal handler for page_published and page_unpublished. Drops the
+    entry for the old revision and records the newly published one.'''
+    cache.delete(BODY_KEY % (instance.pk, revision_token(instance)))
+    if revision is not None:
+        cache.set(REVISION_KEY % instance.pk, revision.pk, None)
+    else:
+        cache.delete(REVISION_KEY % instance.pk)
@@ -0,0 +1,56 @@
+from home.versioned_cache import VersionedCache
+
+VERSION_KEY = 'home:snippets:version'
+
+
+def load_socials():
+    from home.models import Social
+    return list(Social.objects.select_related(
+        'page', 'link_page', 'link_document', 'link_image'))
+
+
+def load_copyright():
+    from home.models import Copyright
+    return list(Copyright.objects.select_related('page'))
+
+
+def load_footer():
+    from home.models import AboutFooter
+    return list(AboutFooter.objects.select_related('page'))
+
+
+def load_logos():
+    from home.models import Logo
+    logos = list(Logo.objects.select_related('page', 'image'))
+    # The rendition is looked up once here rather than on every render.
+    for logo in logos:
+        logo.rendition_url = None
+        if logo.image:
+            logo.rendition_url = logo.image.get_rendition('width-250').url
+    return logos
+
+
+class SnippetCache(VersionedCache):
+    '''Process local copy of the site chrome snippets. A save or delete of
+    any of them bumps the shared version.'''
+
+    version_key = VERSION_KEY
+    interval_setting = 'SNIPPET_CACHE_CHECK_INTERVAL'
+
+    loaders = {
+        'socials': load_socials,
+        'copyright': load_copyright,
+        'footer': load_footer,
+        'logos': load_logos,
+    }
+
+    def load(self, name):
+        return self.loaders[name]()
+
+
+snippet_cache = SnippetCache()
+
+
+def bump_snippet_version(*args, **kwargs):
+    '''Signal handler for saves and deletes of the snippet models.'''
+    snippet_cache.bump()
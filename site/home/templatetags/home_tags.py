@@ -4,8 +4,12 @@ from django import template
 from django.conf import settings
 from django.core.exceptions import ObjectDoesNotExist
 
-from home.models import Social, Copyright, AboutFooter, Logo, \
-    Page, BlogPageMediaItem, AboutPageContactItem, MediaItem
+from home.ancestors import ancestor_cache
+from home.models import AboutPage, AboutPageContactItem, BlogIndexPage, \
+    SeasonPage, embed_provider
+from home.render_cache import render_body
+from home.snippets import snippet_cache
+from home.utils import media_items_for
 
 register = template.Library()
 
@@ -48,45 +52,38 @@ def contact_item(context, item):
 @register.inclusion_tag('home/tags/index_image.html', takes_context=True)
 def index_image(context):
     self = context.get('self')
-    if self.content_type.model == 'blogindexpage':
-        blog_index = self
-    elif self.content_type.model == 'aboutpage':
-        blog_index = self
-    elif self.content_type.model == 'seasonpage':
-        blog_index = self
+    request = context['request']
+    ancestors = ancestor_cache.get(self, getattr(request, 'site', None))
+    if isinstance(self, (BlogIndexPage, AboutPage, SeasonPage)):
+        blog_index = ancestors[-1]
     else:
-        blog_index = self.get_parent().specific
+        blog_index = ancestors[-2] if len(ancestors) > 1 else ancestors[-1]
     return {
         'blog_index': blog_index,
-        'request': context['request'],
+        'request': request,
     }
 
 
 def blog_item(context, blog):
-    self = context.get('self')
-    try:
-        media_item = BlogPageMediaItem.objects.get(page=blog)
-    except:
-        try:
-            media_item = MediaItem.objects.get(page=blog)
-        except:
-            media_item = None
-    
-    supported_sites = None
-    if media_item:
-        try:
-            url_split = media_item.link_external.split('.')
-            supported_sites = []
-            if 'youtube' in url_split:
-                supported_sites.append('youtube')
-            elif 'soundcloud' in url_split:
-                supported_sites.append('soundcloud')
-            elif 'vimeo' in url_split:
-                supported_sites.append('vimeo')
-        except AttributeError:
-            pass
+    # Listing pages resolve every card's media item in one go.
+    media_items = context.get('media_items')
+    if media_items is None:
+        media_items = media_items_for([blog])
+    media_item = media_items.get(blog.pk)
+
+    supported_sites = []
+    link_external = getattr(media_item, 'link_external', '')
+    if link_external:
+        # Items saved before the provider was stored are classified here.
+        provider = media_item.provider or embed_provider(link_external)
+        if provider:
+            supported_sites.append(provider)
+    blog_url = getattr(blog, 'listing_url', None)
+    if blog_url is None:
+        blog_url = blog.relative_url(getattr(context['request'], 'site', None))
     return {
         'blog': blog,
+        'blog_url': blog_url,
         'media_item': media_item,
         'supported_sites': supported_sites,
         'request': context['request'],
@@ -112,14 +109,26 @@ def venue_index_item(context, venue):
         open_days = str(len(open_hours))
     else:
         open_days = False
+    venue_url = getattr(venue, 'listing_url', None)
+    if venue_url is None:
+        venue_url = venue.relative_url(
+            getattr(context['request'], 'site', None))
     return {
         'address': short_address,
         'open_days': open_days,
         'venue': venue,
+        'venue_url': venue_url,
         'request': context['request']
     }
 
 
+# Cached StreamField body
+@register.simple_tag(takes_context=True)
+def streamfield_body(context, page):
+    request = context.get('request')
+    return render_body(page, preview=getattr(request, 'is_preview', False))
+
+
 # Breadcrumb tag
 @register.inclusion_tag('home/tags/breadcrumbs.html', takes_context=True)
 def breadcrumbs(context):
@@ -128,8 +137,8 @@ def breadcrumbs(context):
         # When on the home page, displaying breadcrumbs is irrelevant.
         ancestors = ()
     else:
-        ancestors = Page.objects.ancestor_of(
-            self, inclusive=True).filter(depth__gt=1)
+        ancestors = ancestor_cache.get(
+            self, getattr(context['request'], 'site', None))
     return {
         'ancestors': ancestors,
         'request': context['request'],
@@ -143,13 +152,22 @@ def index_pagination(context):
     for num in range(1, paginator.paginator.num_pages + 1):
         if -1 <= paginator.number - num <= 1:
             render_nums.append(num)
+    # The other query parameters, such as a filter, carried to each link.
+    params = context['request'].GET.copy()
+    params.pop('page', None)
     return {
         'paginator': paginator,
         'pages': render_nums,
+        'querystring': params.urlencode(),
         'request': context['request'],
     }
 
 
+@register.filter
+def srcset(venue_image, image_format='jpeg'):
+    return venue_image.srcset(image_format)
+
+
 @register.filter
 def openhour_time(value):
     hour = int(value[:2])
@@ -162,7 +180,7 @@ def openhour_time(value):
 @register.inclusion_tag('home/tags/base/social.html', takes_context=True)
 def social(context):
     return {
-        'socials': Social.objects.select_related('page'),
+        'socials': snippet_cache.get('socials'),
         'request': context['request'],
     }
 
@@ -171,7 +189,7 @@ def social(context):
 @register.inclusion_tag('home/tags/base/copyright.html', takes_context=True)
 def copyright_snippet(context):
     return {
-        'copyright': Copyright.objects.select_related('page'),
+        'copyright': snippet_cache.get('copyright'),
         'request': context['request'],
     }
 
@@ -180,7 +198,7 @@ def copyright_snippet(context):
 @register.inclusion_tag('home/tags/base/footer_about.html', takes_context=True)
 def aboutfooter(context):
     return {
-        'footer': AboutFooter.objects.select_related('page'),
+        'footer': snippet_cache.get('footer'),
         'request': context['request'],
     }
 
@@ -189,6 +207,6 @@ def aboutfooter(context):
 @register.inclusion_tag('home/tags/base/logo.html', takes_context=True)
 def logo(context):
     return {
-        'logos': Logo.objects.select_related('page'),
+        'logos': snippet_cache.get('logos'),
         'request': context['request'],
     }
@@ -0,0 +1,57 @@
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from wagtail.wagtailcore.models import Page, Site
+
+from home.models import BlogIndexPage, BlogPage, Competition, NewsItem, \
+    SeasonPage
+
+
+class SeasonPageQueryCountTest(TestCase):
+    def setUp(self):
+        root = Page.objects.get(depth=1)
+        self.season = root.add_child(
+            instance=SeasonPage(title='Season', slug='season'))
+        self.news = self.season.add_child(
+            instance=BlogIndexPage(title='News', slug='news'))
+        NewsItem.objects.create(page=self.season, link_page=self.news)
+        site = Site.objects.get(is_default_site=True)
+        site.root_page = self.season
+        site.save()
+
+    def add_content(self, count):
+        start = BlogPage.objects.count()
+        for number in range(start, start + count):
+            self.news.add_child(instance=BlogPage(
+                title='Post %d' % number,
+                slug='post-%d' % number,
+                body='[]'))
+            Competition.objects.create(
+                page=self.season,
+                title='Division %d' % number,
+                poolstat_url='http://example.com/%d' % number)
+
+    def render(self):
+        # The first request warms the process caches the site chrome and
+        # breadcrumbs read from, which content changes invalidate.
+        self.client.get('/')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/')
+        self.assertEqual(response.status_code, 200)
+        return response, len(queries)
+
+    def test_query_count_is_fixed(self):
+        self.add_content(2)
+        response, baseline = self.render()
+        self.assertEqual(len(response.context['primary_news']), 1)
+        self.assertEqual(len(response.context['secondary_news']), 1)
+        self.assertContains(response, 'Division 1')
+
+        self.add_content(8)
+        self.client.get('/')
+        with self.assertNumQueries(baseline):
+            response = self.client.get('/')
+        self.assertEqual(len(response.context['secondary_news']), 3)
+        self.assertContains(response, 'Division 9')
+        self.assertContains(response, self.news.url)
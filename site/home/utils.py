@@ -0,0 +1,78 @@
+from collections import defaultdict
+
+from django.contrib.contenttypes.models import ContentType
+
+
+def specific_pages(pages):
+    '''Given base Page objects, return their specific instances in the same
+    order. Each page type is loaded in one query, leaving out any fields
+    the model lists in listing_defer and joining any it lists in
+    listing_related.'''
+    pks_by_type = defaultdict(list)
+    for page in pages:
+        pks_by_type[page.content_type_id].append(page.pk)
+
+    pages_by_type = {}
+    for content_type_id, pks in pks_by_type.items():
+        model = ContentType.objects.get_for_id(content_type_id).model_class()
+        queryset = model.objects.defer(*getattr(model, 'listing_defer', ()))
+        related = getattr(model, 'listing_related', ())
+        if related:
+            queryset = queryset.select_related(*related)
+        pages_by_type[content_type_id] = queryset.in_bulk(pks)
+
+    return [
+        pages_by_type[page.content_type_id][page.pk] for page in pages]
+
+
+def media_items_for(pages):
+    '''Map page ids to the media item shown on their listing card, using
+    one query for the blog pages and one for the document pages. Like
+    page.media_item.first(), that is each page's item with the lowest pk.'''
+    from home.models import BlogPage, BlogPageMediaItem, DocumentPage, \
+        MediaItem
+
+    media_items = {}
+    sources = (
+        (BlogPage, BlogPageMediaItem.objects.select_related('link_image')),
+        (DocumentPage, MediaItem.objects.select_related(
+            'link_image', 'link_document')))
+    for model, items in sources:
+        pks = [page.pk for page in pages if isinstance(page, model)]
+        if pks:
+            for media_item in items.filter(
+                    page_id__in=pks).order_by('page_id', 'pk'):
+                media_items.setdefault(media_item.page_id, media_item)
+    return media_items
+
+
+def page_url(url_path, root_paths, site=None):
+    '''A page's URL from its url_path, the way Page.relative_url builds it
+    but from site root paths the caller looked up once. Each lookup of
+    the root paths is a cache read, a query with the database cache.'''
+    from django.conf import settings
+    from django.core.urlresolvers import reverse
+
+    for site_id, root_path, root_url in root_paths:
+        if url_path.startswith(root_path):
+            page_path = reverse(
+                'wagtail_serve', args=(url_path[len(root_path):],))
+            if not getattr(settings, 'WAGTAIL_APPEND_SLASH', True) and \
+                    page_path != '/':
+                page_path = page_path.rstrip('/')
+            if len(root_paths) == 1 or (
+                    site is not None and site_id == site.pk):
+                return page_path
+            return root_url + page_path
+    return None
+
+
+def set_listing_urls(pages, site=None):
+    '''Give each page a listing_url for its card, reading the site root
+    paths once instead of once per {% pageurl %}.'''
+    from wagtail.wagtailcore.models import Site
+
+    root_paths = Site.get_site_root_paths()
+    for page in pages:
+        page.listing_url = page_url(page.url_path, root_paths, site)
+    return pages
@@ -0,0 +1,70 @@
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+class VersionedCache(object):
+    '''Process local store of values loaded from the database, kept in
+    step across processes by a version in the shared cache. Each process
+    checks the version at most every check_interval seconds and drops its
+    values when it changes, so reads in between make no queries at all.
+    bump() changes the version for every process.
+
+    Subclasses give the version key and the setting naming the check
+    interval, and either implement load(key) or call fetch() with their
+    own loader.'''
+
+    version_key = None
+    interval_setting = None
+    default_interval = 5
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.data = {}
+        self.version = None
+        self.checked = 0
+        # Bumped whenever data is dropped, so a value loaded before a
+        # drop is never stored after it.
+        self.generation = 0
+
+    @property
+    def check_interval(self):
+        return getattr(settings, self.interval_setting, self.default_interval)
+
+    def load(self, key):
+        raise NotImplementedError
+
+    def get(self, key):
+        return self.fetch(key, lambda: self.load(key))
+
+    def fetch(self, key, load):
+        with self.lock:
+            now = time.time()
+            if now - self.checked >= self.check_interval:
+                version = cache.get(self.version_key)
+                if version != self.version:
+                    self.data = {}
+                    self.generation += 1
+                    self.version = version
+                self.checked = now
+            if key in self.data:
+                return self.data[key]
+            generation = self.generation
+        value = load()
+        with self.lock:
+            if generation == self.generation:
+                self.data[key] = value
+        return value
+
+    def clear(self):
+        with self.lock:
+            self.data = {}
+            self.generation += 1
+            self.checked = 0
+
+    def bump(self):
+        cache.set(self.version_key, uuid.uuid4().hex, None)
+        self.clear()
@@ -37,9 +37,9 @@ BASE_DIR = os.path.dirname(PROJECT_DIR)
 # Application definition
 
 INSTALLED_APPS = [
-    'home',
+    'home.apps.HomeConfig',
     'venues.apps.VenuesConfig',
-    'search',
+    'search.apps.SearchConfig',
 
     'wagtail.wagtailforms',
     'wagtail.wagtailredirects',
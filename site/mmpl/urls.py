@@ -5,6 +5,7 @@ from django.conf.urls import include, url
 from django.contrib import admin
 
 from search import views as search_views
+from venues import views as venue_views
 from wagtail.wagtailadmin import urls as wagtailadmin_urls
 from wagtail.wagtailcore import urls as wagtail_urls
 from wagtail.wagtaildocs import urls as wagtaildocs_urls
@@ -16,6 +17,8 @@ urlpatterns = [
     url(r'^documents/', include(wagtaildocs_urls)),
 
     url(r'^search/$', search_views.search, name='search'),
+    url(r'^search/suggest/$', search_views.suggest, name='search_suggest'),
+    url(r'^venues/nearby/$', venue_views.nearby, name='venues_nearby'),
 
     url(r'', include(wagtail_urls)),
 ]
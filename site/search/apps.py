@@ -0,0 +1,31 @@
+from __future__ import unicode_literals
+
+from django.apps import AppConfig
+from django.db.models.signals import post_delete, post_migrate, post_save
+from wagtail.wagtailcore.signals import page_published, page_unpublished
+
+
+class SearchConfig(AppConfig):
+    '''Config method for naming app and registering signals.'''
+    name = 'search'
+
+    def ready(self):
+        from wagtail.wagtailcore.models import Page
+        from search.fulltext import index_page_handler, \
+            index_venue_handler, remove_page_handler, setup_handler
+        from search.results import bump_content_version
+        from search.suggest import record_change
+        from venues.models import VenueDetails
+
+        post_migrate.connect(setup_handler, sender=self)
+        page_published.connect(index_page_handler)
+        page_unpublished.connect(remove_page_handler)
+        post_delete.connect(remove_page_handler, sender=Page)
+        post_save.connect(index_venue_handler, sender=VenueDetails)
+        page_published.connect(bump_content_version)
+        page_unpublished.connect(bump_content_version)
+        post_delete.connect(bump_content_version, sender=Page)
+        post_save.connect(bump_content_version, sender=VenueDetails)
+        page_published.connect(record_change)
+        page_unpublished.connect(record_change)
+        post_delete.connect(record_change, sender=Page)
@@ -0,0 +1,302 @@
+'''Local full-text index of live pages.
+
+Titles, blog bodies, document descriptions and venue blurbs and addresses
+are kept in an SQLite FTS5 table or a PostgreSQL tsvector table, depending
+on the database in use, and queried for ranked results with highlighted
+snippets. The table is created and filled after migrate, or by the
+rebuild_fulltext_index command. With any other database, an SQLite built
+without FTS5 or no table yet, available() is False and the search view
+uses Wagtail's search instead.
+'''
+import logging
+import re
+import threading
+import time
+from collections import namedtuple
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connection, \
+    transaction
+from django.utils import six
+from django.utils.html import escape, strip_tags
+
+logger = logging.getLogger(__name__)
+
+SearchHit = namedtuple('SearchHit', 'page_id snippet')
+
+# Control characters mark highlights inside snippets, so the snippet text
+# can be escaped before the markers are turned into <mark> tags.
+MARK_START = '\x02'
+MARK_END = '\x03'
+
+
+def _text(value):
+    '''Plain text from a StreamField block value of any shape.'''
+    if value is None:
+        return ''
+    if hasattr(value, 'source'):
+        return strip_tags(value.source)
+    if isinstance(value, six.string_types):
+        return strip_tags(value)
+    if isinstance(value, dict):
+        return ' '.join(_text(item) for item in value.values())
+    if isinstance(value, (list, tuple)):
+        return ' '.join(_text(item) for item in value)
+    return ''
+
+
+def page_text(page):
+    '''Title and body text to index for a specific page.'''
+    from home.models import BlogPage, DocumentPage, VenuePage
+
+    body = []
+    if isinstance(page, BlogPage):
+        body.extend(_text(child.value) for child in page.body)
+    elif isinstance(page, DocumentPage):
+        body.append(page.description)
+    elif isinstance(page, VenuePage):
+        body.append(page.blurb)
+        details = getattr(page, 'venue_details', None)
+        if details is not None:
+            body.append(details.address)
+    return page.title, ' '.join(part for part in body if part)
+
+
+def search_terms(query):
+    return re.findall(r'\w+', query, re.UNICODE)
+
+
+def format_snippet(snippet):
+    return escape(snippet).replace(MARK_START, '<mark>').replace(
+        MARK_END, '</mark>')
+
+
+class SQLiteBackend(object):
+    def create(self, cursor):
+        cursor.execute(
+            'CREATE VIRTUAL TABLE IF NOT EXISTS search_fulltext USING '
+            'fts5(page_id UNINDEXED, title, body, '
+            'tokenize="porter unicode61")')
+
+    def index(self, cursor, page_id, title, body):
+        cursor.execute(
+            'DELETE FROM search_fulltext WHERE page_id = %s', [page_id])
+        cursor.execute(
+            'INSERT INTO search_fulltext (page_id, title, body) '
+            'VALUES (%s, %s, %s)', [page_id, title, body])
+
+    def remove(self, cursor, page_id):
+        cursor.execute(
+            'DELETE FROM search_fulltext WHERE page_id = %s', [page_id])
+
+    def clear(self, cursor):
+        cursor.execute('DELETE FROM search_fulltext')
+
+    def search(self, cursor, terms, limit):
+        match = ' '.join('"%s"' % term for term in terms)
+        cursor.execute(
+            'SELECT page_id, snippet(search_fulltext, 2, %s, %s, '
+            '\'...\', 24) FROM search_fulltext WHERE search_fulltext '
+            'MATCH %s ORDER BY bm25(search_fulltext, 0, 10.0, 1.0) '
+            'LIMIT %s', [MARK_START, MARK_END, match, limit])
+        return cursor.fetchall()
+
+
+class PostgresBackend(object):
+    def create(self, cursor):
+        cursor.execute(
+            'CREATE TABLE IF NOT EXISTS search_fulltext ('
+            'page_id integer PRIMARY KEY, title text, body text, '
+            'document tsvector)')
+        cursor.execute(
+            'CREATE INDEX IF NOT EXISTS search_fulltext_document '
+            'ON search_fulltext USING gin(document)')
+
+    def index(self, cursor, page_id, title, body):
+        self.remove(cursor, page_id)
+        cursor.execute(
+            'INSERT INTO search_fulltext (page_id, title, body, document) '
+            'VALUES (%s, %s, %s, '
+            'setweight(to_tsvector(\'english\', %s), \'A\') || '
+            'setweight(to_tsvector(\'english\', %s), \'D\'))',
+            [page_id, title, body, title, body])
+
+    def remove(self, cursor, page_id):
+        cursor.execute(
+            'DELETE FROM search_fulltext WHERE page_id = %s', [page_id])
+
+    def clear(self, cursor):
+        cursor.execute('DELETE FROM search_fulltext')
+
+    def search(self, cursor, terms, limit):
+        # Snippets are only built for the rows that survive the LIMIT.
+        cursor.execute(
+            'SELECT page_id, ts_headline(\'english\', body, query, %s) '
+            'FROM (SELECT page_id, body, query, '
+            'ts_rank_cd(document, query) AS rank '
+            'FROM search_fulltext, plainto_tsquery(\'english\', %s) query '
+            'WHERE document @@ query ORDER BY rank DESC LIMIT %s) ranked '
+            'ORDER BY rank DESC',
+            ['StartSel=%s, StopSel=%s, MaxWords=24, MinWords=12' % (
+                MARK_START, MARK_END), ' '.join(terms), limit])
+        return cursor.fetchall()
+
+
+BACKENDS = {
+    'sqlite': SQLiteBackend,
+    'postgresql': PostgresBackend,
+}
+
+_backend = None
+_checked = False
+_failed_at = None
+_lock = threading.Lock()
+
+
+def setup():
+    '''Create the table for the default database if it is missing and
+    fill it from every live page if it is empty. Returns the backend, or
+    None when full-text search isn't available there. Run after migrate
+    and by rebuild_fulltext_index, never on the request path.'''
+    backend_class = BACKENDS.get(connection.vendor)
+    if backend_class is None:
+        return None
+    backend = backend_class()
+    with transaction.atomic(), connection.cursor() as cursor:
+        backend.create(cursor)
+        cursor.execute('SELECT 1 FROM search_fulltext LIMIT 1')
+        empty = cursor.fetchone() is None
+    if empty:
+        fill(backend)
+    return backend
+
+
+def get_backend():
+    '''The backend for the default database, or None when full-text
+    search isn't available there or its table hasn't been set up.
+
+    Requests only check that the table exists, once per process, under a
+    lock. After a failed check the search view uses Wagtail's search and
+    the check is not tried again for SEARCH_FULLTEXT_RETRY_INTERVAL
+    seconds.'''
+    global _backend, _checked, _failed_at
+    if _checked:
+        return _backend
+    with _lock:
+        if _checked:
+            return _backend
+        retry = getattr(settings, 'SEARCH_FULLTEXT_RETRY_INTERVAL', 300)
+        if _failed_at is not None and time.time() - _failed_at < retry:
+            return None
+        backend_class = BACKENDS.get(connection.vendor)
+        backend = None
+        if backend_class is not None:
+            try:
+                with transaction.atomic(), connection.cursor() as cursor:
+                    cursor.execute('SELECT 1 FROM search_fulltext LIMIT 1')
+                backend = backend_class()
+            except DatabaseError:
+                logger.warning(
+                    'Full-text index unavailable, using Wagtail search',
+                    exc_info=True)
+                _failed_at = time.time()
+                return None
+        _backend = backend
+        _checked = True
+        return _backend
+
+
+def reset():
+    '''Forget the result of the last check, after the table is set up.'''
+    global _backend, _checked, _failed_at
+    with _lock:
+        _backend = None
+        _checked = False
+        _failed_at = None
+
+
+def available():
+    return get_backend() is not None
+
+
+def index_page(page):
+    backend = get_backend()
+    if backend is None:
+        return
+    title, body = page_text(page)
+    with transaction.atomic(), connection.cursor() as cursor:
+        backend.index(cursor, page.pk, title, body)
+
+
+def remove_page(page_id):
+    backend = get_backend()
+    if backend is None:
+        return
+    with connection.cursor() as cursor:
+        backend.remove(cursor, page_id)
+
+
+def fill(backend):
+    '''Index every live page from scratch, returning the page count.'''
+    from wagtail.wagtailcore.models import Page
+
+    count = 0
+    with transaction.atomic(), connection.cursor() as cursor:
+        backend.clear(cursor)
+        for page in Page.objects.live().filter(depth__gt=1).specific():
+            title, body = page_text(page)
+            backend.index(cursor, page.pk, title, body)
+            count += 1
+    return count
+
+
+def rebuild():
+    '''Set up the table if needed and rebuild the index from every live
+    page, returning the count.'''
+    backend = setup()
+    reset()
+    if backend is None:
+        return 0
+    return fill(backend)
+
+
+def search(query, limit=500):
+    '''Ranked hits for a query, best first, with highlighted snippets.'''
+    backend = get_backend()
+    terms = search_terms(query)
+    if backend is None or not terms:
+        return []
+    with connection.cursor() as cursor:
+        rows = backend.search(cursor, terms, limit)
+    return [
+        SearchHit(int(page_id), format_snippet(snippet or ''))
+        for page_id, snippet in rows]
+
+
+def setup_handler(sender, using=DEFAULT_DB_ALIAS, **kwargs):
+    '''Signal handler for post_migrate.'''
+    if using != DEFAULT_DB_ALIAS:
+        return
+    try:
+        setup()
+    except DatabaseError:
+        logger.warning('Could not set up the full-text index', exc_info=True)
+    reset()
+
+
+def index_page_handler(sender, instance, **kwargs):
+    '''Signal handler for page_published.'''
+    index_page(instance)
+
+
+def remove_page_handler(sender, instance, **kwargs):
+    '''Signal handler for page_unpublished and page deletes.'''
+    remove_page(instance.pk)
+
+
+def index_venue_handler(sender, instance, **kwargs):
+    '''Signal handler for VenueDetails saves, which fill in the address
+    after the venue page has been published.'''
+    venue_page = instance.venue_page
+    if venue_page.live:
+        index_page(venue_page)
@@ -0,0 +1,137 @@
+'''Buffered recording of search hits.
+
+Search requests only count hits in memory. A background thread writes
+the counts to wagtailsearch's Query and QueryDailyHits tables every
+SEARCH_HIT_FLUSH_INTERVAL seconds, and again at exit, so the promoted
+search statistics in the admin lag by at most one interval. Each flush
+writes every query and day it holds in a handful of statements.
+'''
+import atexit
+import logging
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Case, F, IntegerField, When
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+
+class HitBuffer(object):
+    '''Thread safe in process counter of search hits per query and day.'''
+
+    def __init__(self, interval=None):
+        self.interval = interval or getattr(
+            settings, 'SEARCH_HIT_FLUSH_INTERVAL', 60)
+        self.counts = Counter()
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.thread = None
+
+    def record(self, query_string):
+        from wagtail.wagtailsearch.utils import normalise_query_string
+
+        query_string = normalise_query_string(query_string)
+        if not query_string:
+            return
+        with self.lock:
+            self.counts[(query_string, timezone.now().date())] += 1
+            if self.thread is None:
+                self.start()
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run)
+        self.thread.daemon = True
+        self.thread.start()
+        atexit.register(self.flush)
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.flush()
+            except Exception:
+                logger.warning('Failed to flush search hits', exc_info=True)
+            finally:
+                connection.close()
+
+    def flush(self):
+        '''Write the buffered counts. Counts are put back if the write
+        fails so they go out with the next flush.'''
+        with self.flush_lock:
+            with self.lock:
+                counts, self.counts = self.counts, Counter()
+            if not counts:
+                return
+            try:
+                write_hits(counts)
+            except Exception:
+                with self.lock:
+                    self.counts.update(counts)
+                raise
+
+
+def write_hits(counts):
+    '''Add counts, keyed by (normalised query string, date), to the
+    daily hits tables.'''
+    from wagtail.wagtailsearch.models import QueryDailyHits
+
+    with transaction.atomic():
+        queries = ensure_queries(set(query for query, _ in counts))
+        counts = dict(((queries[query], date), hits)
+                      for (query, date), hits in counts.items())
+
+        existing = QueryDailyHits.objects.filter(
+            query_id__in=set(query_id for query_id, _ in counts),
+            date__in=set(date for _, date in counts),
+        ).values_list('pk', 'query_id', 'date')
+        increments = {}
+        for pk, query_id, date in existing:
+            hits = counts.pop((query_id, date), None)
+            if hits is not None:
+                increments[pk] = hits
+        if increments:
+            QueryDailyHits.objects.filter(pk__in=increments).update(
+                hits=Case(
+                    *[When(pk=pk, then=F('hits') + hits)
+                      for pk, hits in increments.items()],
+                    output_field=IntegerField()))
+
+        try:
+            with transaction.atomic():
+                QueryDailyHits.objects.bulk_create([
+                    QueryDailyHits(query_id=query_id, date=date, hits=hits)
+                    for (query_id, date), hits in counts.items()])
+        except IntegrityError:
+            # Another process created some of the same rows first.
+            for (query_id, date), hits in counts.items():
+                daily, _ = QueryDailyHits.objects.get_or_create(
+                    query_id=query_id, date=date)
+                QueryDailyHits.objects.filter(pk=daily.pk).update(
+                    hits=F('hits') + hits)
+
+
+def ensure_queries(query_strings):
+    '''Map query strings to Query ids, creating the missing Querys.'''
+    from wagtail.wagtailsearch.models import Query
+
+    queries = dict(Query.objects.filter(
+        query_string__in=query_strings).values_list('query_string', 'pk'))
+    missing = [query for query in query_strings if query not in queries]
+    if missing:
+        try:
+            with transaction.atomic():
+                Query.objects.bulk_create(
+                    [Query(query_string=query) for query in missing])
+        except IntegrityError:
+            for query in missing:
+                Query.objects.get_or_create(query_string=query)
+        queries.update(Query.objects.filter(
+            query_string__in=missing).values_list('query_string', 'pk'))
+    return queries
+
+
+hit_buffer = HitBuffer()
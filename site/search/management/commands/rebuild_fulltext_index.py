@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from search import fulltext
+
+
+class Command(BaseCommand):
+    help = ('Create the local full-text index if needed and rebuild it '
+            'from every live page.')
+
+    def handle(self, *args, **options):
+        if not fulltext.BACKENDS.get(connection.vendor):
+            raise CommandError(
+                'Full-text search is not available on this database.')
+        count = fulltext.rebuild()
+        self.stdout.write('Indexed %d pages' % count)
@@ -0,0 +1,27 @@
+from __future__ import unicode_literals
+
+from django.db import models, transaction
+
+
+class SuggestSequenceManager(models.Manager):
+    def current(self):
+        '''The number of the latest suggestion change, 0 before any.'''
+        value = self.filter(pk=1).values_list('value', flat=True).first()
+        return value or 0
+
+    def advance(self):
+        '''Take the next number for a suggestion change. The row stays
+        locked by the update until the transaction commits, so concurrent
+        changes are numbered in the order they commit and never share a
+        number.'''
+        with transaction.atomic():
+            self.get_or_create(pk=1)
+            self.filter(pk=1).update(value=models.F('value') + 1)
+            return self.filter(pk=1).values_list('value', flat=True).get()
+
+
+class SuggestSequence(models.Model):
+    '''Single row counter numbering the search suggestion change log.'''
+    value = models.PositiveIntegerField(default=0)
+
+    objects = SuggestSequenceManager()
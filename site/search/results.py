@@ -0,0 +1,66 @@
+'''Cache of ranked search results keyed by normalised query text.
+
+Each entry holds the ordered page ids and snippets for a query, so a
+repeat of a popular query, or the next page of it, skips the search and
+the count. Keys include a content version that is bumped whenever a
+page is published, unpublished or deleted, which retires every cached
+result at once.
+'''
+import hashlib
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.encoding import force_bytes
+
+from search import fulltext
+from search.fulltext import SearchHit
+
+VERSION_KEY = 'search:content:version'
+
+
+def normalise(query_string):
+    from wagtail.wagtailsearch.utils import normalise_query_string
+    return normalise_query_string(query_string)
+
+
+def make_key(query_string, version):
+    digest = hashlib.sha1(force_bytes(normalise(query_string))).hexdigest()
+    return 'search:results:%s:%s' % (version, digest)
+
+
+def content_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        version = uuid.uuid4().hex
+        if not cache.add(VERSION_KEY, version, None):
+            version = cache.get(VERSION_KEY)
+    return version
+
+
+def run_search(query_string, limit):
+    '''Ranked hits for a query from the full-text index, or from
+    Wagtail's search without snippets when the index isn't available.'''
+    from wagtail.wagtailcore.models import Page
+
+    if fulltext.available():
+        return fulltext.search(query_string, limit)
+    results = Page.objects.live().search(query_string)[:limit]
+    return [SearchHit(page.pk, '') for page in results]
+
+
+def get_results(query_string):
+    '''Ordered SearchHits for a query, from the cache when possible.'''
+    limit = getattr(settings, 'SEARCH_RESULTS_LIMIT', 500)
+    key = make_key(query_string, content_version())
+    hits = cache.get(key)
+    if hits is None:
+        hits = [tuple(hit) for hit in run_search(query_string, limit)]
+        cache.set(key, hits, getattr(
+            settings, 'SEARCH_RESULTS_CACHE_TIMEOUT', 60 * 15))
+    return [SearchHit(*hit) for hit in hits]
+
+
+def bump_content_version(*args, **kwargs):
+    '''Signal handler for page publishes, unpublishes and deletes.'''
+    cache.set(VERSION_KEY, uuid.uuid4().hex, None)
@@ -0,0 +1,274 @@
+'''In memory prefix index for search suggestions.
+
+Live page titles (venue pages are venue names) and competition titles
+are normalised the way wagtailsearch normalises queries and stored as a
+sorted list of keys, one per word of each title onwards, so a prefix
+lookup is a bisect and a short scan. Matches are ranked by the recent
+wagtailsearch hits of queries that match them.
+
+Publishing, unpublishing or deleting a page appends the page id to a
+change log in the shared cache, numbered by a counter row in the
+database so concurrent changes never share a number. Each process checks the log at most
+every check_interval seconds and re-indexes only the changed pages,
+falling back to a full build when it has fallen too far behind. The
+whole index is also rebuilt every rebuild_interval seconds to pick up
+new popularity figures. All of this happens off the request path.
+'''
+import logging
+import threading
+import time
+from bisect import bisect_left, insort
+from collections import defaultdict, namedtuple
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from search.models import SuggestSequence
+
+logger = logging.getLogger(__name__)
+
+CHANGE_KEY = 'search:suggest:change:%d'
+MAX_CHANGES = 200
+DAY = 60 * 60 * 24
+
+Suggestion = namedtuple('Suggestion', 'title url kind')
+
+
+def normalise(text):
+    from wagtail.wagtailsearch.utils import normalise_query_string
+    return normalise_query_string(text)
+
+
+def title_keys(title):
+    '''Index keys for a title: the title from each word onwards.'''
+    words = normalise(title).split()
+    return [' '.join(words[i:]) for i in range(len(words))]
+
+
+def load_suggestions(page_ids=None):
+    '''Map of live page id to its suggestions, for every live page or
+    just the given ids. Uses two queries however many pages match, plus
+    the cached site root paths and content types.'''
+    from django.contrib.contenttypes.models import ContentType
+    from home.models import Competition, VenuePage
+    from home.utils import page_url
+    from wagtail.wagtailcore.models import Page, Site
+
+    pages = Page.objects.live().filter(depth__gt=1)
+    if page_ids is not None:
+        pages = pages.filter(pk__in=page_ids)
+    venue_type = ContentType.objects.get_for_model(VenuePage).pk
+    root_paths = Site.get_site_root_paths()
+
+    suggestions = {}
+    urls = {}
+    for pk, title, url_path, content_type_id in pages.values_list(
+            'pk', 'title', 'url_path', 'content_type_id'):
+        url = page_url(url_path, root_paths)
+        if url is None:
+            continue
+        kind = 'venue' if content_type_id == venue_type else 'page'
+        urls[pk] = url
+        suggestions[pk] = [Suggestion(title, url, kind)]
+    competitions = Competition.objects.filter(
+        page_id__in=list(urls)).values_list('page_id', 'title')
+    for page_id, title in competitions:
+        suggestions[page_id].append(
+            Suggestion(title, urls[page_id], 'competition'))
+    return suggestions
+
+
+def popular_queries():
+    '''Recent hit totals for the most searched normalised queries.'''
+    from wagtail.wagtailsearch.models import Query
+
+    since = timezone.now().date() - timedelta(
+        days=getattr(settings, 'SEARCH_SUGGEST_POPULAR_DAYS', 30))
+    return list(Query.objects.filter(daily_hits__date__gte=since).annotate(
+        total=Sum('daily_hits__hits')).order_by('-total').values_list(
+        'query_string', 'total')[:500])
+
+
+class PrefixIndex(object):
+    '''Sorted (key, page id, position) tuples with the suggestion and
+    score for each (page id, position) item.'''
+
+    def __init__(self, popular):
+        self.popular = popular
+        self.keys = []
+        self.items = {}
+        self.scores = defaultdict(int)
+        self.page_keys = defaultdict(list)
+
+    @classmethod
+    def build(cls, suggestions, popular):
+        index = cls(popular)
+        for page_id, page_suggestions in suggestions.items():
+            index.add(page_id, page_suggestions, score=False)
+        index.keys.sort()
+        for query, hits in popular:
+            for item in index.matches(query):
+                index.scores[item] += hits
+        return index
+
+    def add(self, page_id, suggestions, score=True):
+        for position, suggestion in enumerate(suggestions):
+            item = (page_id, position)
+            self.items[item] = suggestion
+            keys = title_keys(suggestion.title)
+            for key in keys:
+                entry = (key,) + item
+                self.page_keys[page_id].append(entry)
+                if score:
+                    insort(self.keys, entry)
+                else:
+                    self.keys.append(entry)
+            if score:
+                self.scores[item] = sum(
+                    hits for query, hits in self.popular
+                    if any(key.startswith(query) for key in keys))
+
+    def remove(self, page_id):
+        for entry in self.page_keys.pop(page_id, []):
+            i = bisect_left(self.keys, entry)
+            if i < len(self.keys) and self.keys[i] == entry:
+                del self.keys[i]
+            self.items.pop(entry[1:], None)
+            self.scores.pop(entry[1:], None)
+
+    def matches(self, prefix, max_scan=None):
+        '''Distinct items with a key starting with prefix.'''
+        found = set()
+        i = bisect_left(self.keys, (prefix,))
+        end = len(self.keys) if max_scan is None else i + max_scan
+        while i < min(end, len(self.keys)) and \
+                self.keys[i][0].startswith(prefix):
+            found.add(self.keys[i][1:])
+            i += 1
+        return found
+
+    def search(self, prefix, limit, max_scan):
+        items = self.matches(prefix, max_scan)
+        ranked = sorted(items, key=lambda item: (
+            -self.scores.get(item, 0), self.items[item].title.lower()))
+        return [self.items[item] for item in ranked[:limit]]
+
+
+class SuggestIndex(object):
+    '''Process local prefix index kept in step with the change log.
+
+    Builds and updates run on a background thread, one at a time, while
+    requests keep searching the current index. A new full index is built
+    aside and swapped in, so the lock is only held for the swap, for
+    applying already loaded changes and for the lookups themselves.'''
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.index = None
+        self.seq = 0
+        self.built = 0
+        self.checked = 0
+        self.refreshing = False
+
+    @property
+    def check_interval(self):
+        return getattr(settings, 'SEARCH_SUGGEST_CHECK_INTERVAL', 5)
+
+    @property
+    def rebuild_interval(self):
+        return getattr(settings, 'SEARCH_SUGGEST_REBUILD_INTERVAL', 60 * 60)
+
+    def refresh(self):
+        '''Start a background update if one is due and none is running.'''
+        now = time.time()
+        with self.lock:
+            if self.refreshing:
+                return
+            if self.index is not None and \
+                    now - self.checked < self.check_interval and \
+                    now - self.built < self.rebuild_interval:
+                return
+            self.refreshing = True
+            self.checked = now
+        thread = threading.Thread(target=self._refresh)
+        thread.daemon = True
+        thread.start()
+
+    def _refresh(self):
+        try:
+            if self.index is None or \
+                    time.time() - self.built >= self.rebuild_interval:
+                self.rebuild()
+            else:
+                self.apply_changes()
+        except Exception:
+            logger.warning('Failed to update suggestions', exc_info=True)
+        finally:
+            with self.lock:
+                self.refreshing = False
+            connection.close()
+
+    def rebuild(self):
+        # Read the sequence first so changes made during the build are
+        # applied again at the next check.
+        seq = SuggestSequence.objects.current()
+        index = PrefixIndex.build(load_suggestions(), popular_queries())
+        with self.lock:
+            self.index = index
+            self.seq = seq
+            self.built = time.time()
+
+    def apply_changes(self):
+        seq = SuggestSequence.objects.current()
+        if seq == self.seq:
+            return
+        if seq < self.seq or seq - self.seq > MAX_CHANGES:
+            return self.rebuild()
+        keys = [CHANGE_KEY % n for n in range(self.seq + 1, seq + 1)]
+        changes = cache.get_many(keys)
+        if len(changes) < len(keys):
+            return self.rebuild()
+        page_ids = set(changes.values())
+        suggestions = load_suggestions(page_ids)
+        with self.lock:
+            for page_id in page_ids:
+                self.index.remove(page_id)
+                if page_id in suggestions:
+                    self.index.add(page_id, suggestions[page_id])
+            self.seq = seq
+
+    def search(self, query, limit=None):
+        '''Top suggestions for a query, or None while the first build
+        is still running.'''
+        prefix = normalise(query)
+        if not prefix:
+            return []
+        self.refresh()
+        with self.lock:
+            if self.index is None:
+                return None
+            return self.index.search(
+                prefix, limit or 8,
+                getattr(settings, 'SEARCH_SUGGEST_MAX_SCAN', 2000))
+
+    def clear(self):
+        with self.lock:
+            self.built = 0
+            self.checked = 0
+
+
+suggest_index = SuggestIndex()
+
+
+def record_change(sender, instance, **kwargs):
+    '''Signal handler for page publishes, unpublishes and deletes.'''
+    # The entry is written before the new number commits, so a process
+    # that sees the number can always find the entry.
+    with transaction.atomic():
+        seq = SuggestSequence.objects.advance()
+        cache.set(CHANGE_KEY % seq, instance.pk, DAY)
+    suggest_index.checked = 0
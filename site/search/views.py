@@ -1,10 +1,19 @@
 from __future__ import absolute_import, unicode_literals
 
+from django.conf import settings
 from django.core.paginator import EmptyPage, PageNotAnInteger, Paginator
+from django.http import JsonResponse
 from django.shortcuts import render
+from django.utils.cache import patch_cache_control
 
 from wagtail.wagtailcore.models import Page
-from wagtail.wagtailsearch.models import Query
+
+from home.utils import specific_pages
+from search.hits import hit_buffer
+from search.results import get_results
+from search.suggest import suggest_index
+
+MAX_SUGGESTIONS = 20
 
 
 def search(request):
@@ -13,13 +22,12 @@ def search(request):
 
     # Search
     if search_query:
-        search_results = Page.objects.live().search(search_query)
-        query = Query.get(search_query)
+        search_results = get_results(search_query)
 
         # Record hit
-        query.add_hit()
+        hit_buffer.record(search_query)
     else:
-        search_results = Page.objects.none()
+        search_results = []
 
     # Pagination
     paginator = Paginator(search_results, 10)
@@ -30,7 +38,53 @@ def search(request):
     except EmptyPage:
         search_results = paginator.page(paginator.num_pages)
 
+    search_results.object_list = load_hits(search_results.object_list)
+
     return render(request, 'search/search.html', {
         'search_query': search_query,
         'search_results': search_results,
     })
+
+
+def load_hits(hits):
+    '''Specific live pages for a page of hits, in rank order, each with
+    its highlighted snippet. Costs one query for the base pages and one
+    for each page type among them.'''
+    if not hits:
+        return []
+    pages = Page.objects.live().in_bulk([hit.page_id for hit in hits])
+    snippets = {}
+    found = []
+    for hit in hits:
+        page = pages.get(hit.page_id)
+        if page is not None:
+            snippets[page.pk] = hit.snippet
+            found.append(page)
+    results = specific_pages(found)
+    for page in results:
+        page.search_snippet = snippets[page.pk]
+    return results
+
+
+def suggest(request):
+    '''Return the top titles starting with the query, as JSON.'''
+    query = request.GET.get('query', '')
+    try:
+        limit = min(max(int(request.GET.get('limit', 8)), 1), MAX_SUGGESTIONS)
+    except ValueError:
+        limit = 8
+    suggestions = suggest_index.search(query, limit) if query else []
+
+    response = JsonResponse({
+        'query': query,
+        'suggestions': [
+            suggestion._asdict() for suggestion in suggestions or []],
+    })
+    if suggestions is None:
+        # The index is still being built; don't let the empty answer be
+        # cached.
+        patch_cache_control(response, no_cache=True, max_age=0)
+    else:
+        patch_cache_control(response, public=True, max_age=getattr(
+            settings, 'SEARCH_SUGGEST_MAX_AGE', 60))
+    return response
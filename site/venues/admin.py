@@ -1,3 +1,35 @@
 from django.contrib import admin
+from django.db import transaction
+from django.utils import timezone
 
-# Register your models here.
+from venues.models import VenueJob
+
+
+@admin.register(VenueJob)
+class VenueJobAdmin(admin.ModelAdmin):
+    list_display = (
+        'venue_page', 'status', 'attempts', 'run_after', 'updated_at')
+    list_filter = ('status',)
+    readonly_fields = ('locked_at', 'created_at', 'updated_at', 'last_error')
+    actions = ['retry_jobs']
+
+    def retry_jobs(self, request, queryset):
+        # One job per page is put back, reusing a pending one if the page
+        # already has it.
+        venue_page_ids = set(queryset.exclude(
+            status=VenueJob.RUNNING).values_list('venue_page_id', flat=True))
+        for venue_page_id in venue_page_ids:
+            with transaction.atomic():
+                VenueJob.objects.lock_page(venue_page_id)
+                pending = VenueJob.objects.filter(
+                    venue_page_id=venue_page_id, status=VenueJob.PENDING)
+                if not pending.exists():
+                    pending = queryset.filter(
+                        venue_page_id=venue_page_id).exclude(
+                        status=VenueJob.RUNNING).order_by('-pk')[:1]
+                    pending = VenueJob.objects.filter(
+                        pk__in=list(pending.values_list('pk', flat=True)))
+                pending.update(
+                    status=VenueJob.PENDING, attempts=0,
+                    run_after=timezone.now())
+    retry_jobs.short_description = 'Retry selected jobs now'
@@ -1,8 +1,8 @@
 from __future__ import unicode_literals
 
 from django.apps import AppConfig
-from django.db.models.signals import pre_delete
-from wagtail.wagtailcore.signals import page_published
+from django.db.models.signals import post_delete, pre_delete
+from wagtail.wagtailcore.signals import page_published, page_unpublished
 
 
 class VenuesConfig(AppConfig):
@@ -11,8 +11,16 @@ class VenuesConfig(AppConfig):
 
     def ready(self):
         from home.models import VenuePage
-        from venues.models import VenueImage
+        from venues.models import VenueDetails, VenueImage, \
+            VenueImageVariant
         from venues.signals import populate_venue, remove_image
+        from venues.spatial import invalidate_spatial_index
 
         page_published.connect(populate_venue, sender=VenuePage)
+        page_published.connect(invalidate_spatial_index, sender=VenuePage)
+        page_unpublished.connect(invalidate_spatial_index, sender=VenuePage)
+        # Deleting a venue page sends no unpublish signal, but its
+        # details go with it.
+        post_delete.connect(invalidate_spatial_index, sender=VenueDetails)
         pre_delete.connect(remove_image, sender=VenueImage)
+        pre_delete.connect(remove_image, sender=VenueImageVariant)
@@ -0,0 +1,138 @@
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection
+from django.utils.encoding import force_bytes
+
+logger = logging.getLogger(__name__)
+
+VERSION = 1
+WEEK = 60 * 60 * 24 * 7
+
+
+class LocalLRU(object):
+    '''Small thread safe in process LRU used in front of the shared cache.'''
+
+    def __init__(self, size):
+        self.size = size
+        self.data = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            try:
+                value = self.data.pop(key)
+            except KeyError:
+                return None
+            self.data[key] = value
+            return value
+
+    def set(self, key, value):
+        with self.lock:
+            self.data.pop(key, None)
+            self.data[key] = value
+            while len(self.data) > self.size:
+                self.data.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.data.clear()
+
+
+class PlacesCache(object):
+    '''Two tier cache for Places API responses.
+
+    Entries are kept in a local LRU and in the shared Django cache under
+    namespaced, versioned keys. Responses that aren't OK are cached for a
+    shorter time so a failing lookup doesn't hit the API on every call.
+    Once an OK entry is past its fresh time it is still served for the
+    stale window while a background thread fetches a replacement.'''
+
+    def __init__(self, namespace='places', alias=None, fresh_for=None,
+                 stale_for=None, negative_for=None, local_size=None):
+        self.namespace = namespace
+        self.alias = alias or getattr(
+            settings, 'PLACES_CACHE_ALIAS', 'default')
+        self.fresh_for = fresh_for or getattr(
+            settings, 'PLACES_CACHE_TIMEOUT', WEEK)
+        self.stale_for = stale_for or getattr(
+            settings, 'PLACES_CACHE_STALE', WEEK)
+        self.negative_for = negative_for or getattr(
+            settings, 'PLACES_CACHE_NEGATIVE_TIMEOUT', 60 * 60)
+        self.local = LocalLRU(local_size or getattr(
+            settings, 'PLACES_CACHE_LOCAL_SIZE', 256))
+        self.refreshing = set()
+        self.lock = threading.Lock()
+
+    @property
+    def shared(self):
+        return caches[self.alias]
+
+    def make_key(self, kind, key):
+        digest = hashlib.sha1(force_bytes(key)).hexdigest()
+        return '%s:v%d:%s:%s' % (self.namespace, VERSION, kind, digest)
+
+    def get(self, kind, key, fetch, force=False):
+        '''Return the cached response for key, calling fetch() to fill
+        the cache when there is nothing usable. force skips both tiers.'''
+        cache_key = self.make_key(kind, key)
+        if not force:
+            entry = self.local.get(cache_key)
+            if entry is None or entry['expires'] < time.time():
+                entry = self.shared.get(cache_key)
+                if entry is not None:
+                    self.local.set(cache_key, entry)
+            if entry is not None and entry['expires'] >= time.time():
+                if entry['fresh_until'] < time.time():
+                    self.revalidate(cache_key, fetch)
+                return entry['value']
+        return self.store(cache_key, fetch())
+
+    def store(self, cache_key, value):
+        now = time.time()
+        if value.get('status') == 'OK':
+            fresh_for, timeout = self.fresh_for, self.fresh_for + self.stale_for
+        else:
+            fresh_for, timeout = self.negative_for, self.negative_for
+        entry = {
+            'value': value,
+            'fresh_until': now + fresh_for,
+            'expires': now + timeout,
+        }
+        self.shared.set(cache_key, entry, timeout)
+        self.local.set(cache_key, entry)
+        return value
+
+    def revalidate(self, cache_key, fetch):
+        '''Refresh a stale entry in the background, once per key.'''
+        with self.lock:
+            if cache_key in self.refreshing:
+                return
+            self.refreshing.add(cache_key)
+        thread = threading.Thread(
+            target=self._revalidate, args=(cache_key, fetch))
+        thread.daemon = True
+        thread.start()
+
+    def _revalidate(self, cache_key, fetch):
+        try:
+            # Another process may already have refreshed the shared entry.
+            entry = self.shared.get(cache_key)
+            if entry is not None and entry['fresh_until'] >= time.time():
+                self.local.set(cache_key, entry)
+            else:
+                self.store(cache_key, fetch())
+        except Exception:
+            logger.warning('Failed to revalidate %s', cache_key, exc_info=True)
+        finally:
+            with self.lock:
+                self.refreshing.discard(cache_key)
+            connection.close()
+
+
+places_cache = PlacesCache()
@@ -0,0 +1,72 @@
+import logging
+import os
+
+from django.conf import settings
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+VARIANT_PATH = os.path.join('gmaps_images', 'variants')
+FORMATS = (
+    ('webp', 'WEBP', {'quality': 75}),
+    ('jpeg', 'JPEG', {'quality': 80, 'optimize': True, 'progressive': True}),
+)
+
+
+def variant_widths(original_width):
+    '''Widths to generate for an image, never upscaling. An image smaller
+    than every configured width gets a single recompressed variant.'''
+    widths = getattr(settings, 'VENUE_IMAGE_WIDTHS', (320, 640, 1024))
+    widths = [width for width in widths if width < original_width]
+    return widths or [original_width]
+
+
+def write_variants(photo_name):
+    '''Write resized WebP and JPEG copies of a downloaded photo to the
+    media directory, returning (label, width, format) for each copy.
+    Formats Pillow can't encode are skipped. This is the slow part and
+    touches no models, so it runs before any transaction is opened.'''
+    directory = os.path.join(settings.MEDIA_ROOT, VARIANT_PATH)
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    name = os.path.splitext(os.path.basename(photo_name))[0]
+
+    original = Image.open(os.path.join(settings.MEDIA_ROOT, photo_name))
+    original.load()
+    if original.mode != 'RGB':
+        original = original.convert('RGB')
+
+    written = []
+    for width in variant_widths(original.size[0]):
+        height = int(round(original.size[1] * width / float(original.size[0])))
+        resized = original.resize((width, height), Image.LANCZOS)
+        for extension, image_format, options in FORMATS:
+            label = os.path.join(
+                VARIANT_PATH, '%s-%d.%s' % (name, width, extension))
+            try:
+                resized.save(
+                    os.path.join(settings.MEDIA_ROOT, label),
+                    image_format, **options)
+            except (IOError, KeyError):
+                logger.warning(
+                    'Could not write %s variant of %s', image_format, name)
+                continue
+            written.append((label, width, extension))
+    return written
+
+
+def save_variants(venue_image, written):
+    '''Record variants from write_variants() as VenueImageVariants.'''
+    from venues.models import VenueImageVariant
+
+    variants = [
+        VenueImageVariant(
+            venue_image=venue_image, photo=label, width=width, format=fmt)
+        for label, width, fmt in written]
+    VenueImageVariant.objects.bulk_create(variants)
+    return variants
+
+
+def generate_variants(venue_image):
+    '''Write and record the variants of a VenueImage.'''
+    return save_variants(venue_image, write_variants(venue_image.photo.name))
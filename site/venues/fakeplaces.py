@@ -0,0 +1,142 @@
+import hashlib
+import io
+import json
+import random
+import threading
+import time
+
+from django.utils.six.moves import BaseHTTPServer, socketserver
+from django.utils.six.moves.urllib.parse import parse_qs, urlparse
+from PIL import Image
+
+DEFAULT_FIXTURES = {'search': {}, 'details': {}}
+
+
+def fake_place_id(query):
+    return 'fake-' + hashlib.sha1(query.encode('utf-8')).hexdigest()[:16]
+
+
+def synthesize_details(place_id):
+    '''A plausible details response for place ids with no fixture.'''
+    seed = int(hashlib.sha1(place_id.encode('utf-8')).hexdigest()[:8], 16)
+    rnd = random.Random(seed)
+    periods = [{
+        'open': {'day': day, 'time': '1600'},
+        'close': {'day': (day + 1) % 7, 'time': '0100'},
+    } for day in range(7) if rnd.random() > 0.2]
+    return {
+        'status': 'OK',
+        'result': {
+            'place_id': place_id,
+            'formatted_address': '%d Fake Street, Melbourne VIC 3000, '
+                                 'Australia' % rnd.randint(1, 400),
+            'formatted_phone_number': '(03) 9%03d %04d' % (
+                rnd.randint(0, 999), rnd.randint(0, 9999)),
+            'website': 'http://example.com/%s' % place_id,
+            'url': 'https://maps.google.com/?cid=%d' % seed,
+            'geometry': {'location': {
+                'lat': -37.8136 + rnd.uniform(-0.3, 0.3),
+                'lng': 144.9631 + rnd.uniform(-0.3, 0.3),
+            }},
+            'opening_hours': {'periods': periods},
+            'photos': [{
+                'photo_reference': '%s-photo-%d-%d' % (
+                    place_id, index, rnd.randint(0, 10 ** 6)),
+                'width': 1600,
+                'height': 1200,
+            } for index in range(6)],
+        },
+    }
+
+
+class FakePlacesHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    def do_GET(self):
+        server = self.server
+        url = urlparse(self.path)
+        params = dict(
+            (key, values[0]) for key, values in parse_qs(url.query).items())
+        if server.latency:
+            time.sleep(server.latency)
+        failing = server.error_rate and random.random() < server.error_rate
+
+        if url.path == '/maps/api/place/photo':
+            if failing:
+                return self.respond(500, b'', 'text/plain')
+            return self.respond(200, server.photo_bytes(), 'image/jpeg')
+        elif url.path == '/maps/api/place/textsearch/json':
+            query = params.get('query', '')
+            body = server.fixtures['search'].get(query) or {
+                'status': 'OK',
+                'results': [{'place_id': fake_place_id(query), 'name': query}],
+            }
+        elif url.path == '/maps/api/place/details/json':
+            place_id = params.get('placeid', '')
+            body = (server.fixtures['details'].get(place_id) or
+                    synthesize_details(place_id))
+        else:
+            return self.respond(404, b'', 'text/plain')
+
+        if failing:
+            body = {'status': 'OVER_QUERY_LIMIT', 'results': []}
+        self.respond(200, json.dumps(body).encode('utf-8'), 'application/json')
+
+    def respond(self, status, body, content_type):
+        self.server.record(len(body))
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class FakePlacesServer(socketserver.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    '''Local stand in for the Places and Places Photo APIs. Responses come
+    from a fixtures file of recorded responses, keyed by search query and
+    place id, falling back to synthesized ones. Latency in seconds is added
+    to every request and error_rate of them fail with OVER_QUERY_LIMIT,
+    or a 500 for photos.'''
+    daemon_threads = True
+
+    def __init__(self, address=('127.0.0.1', 0), fixtures=None, latency=0,
+                 error_rate=0, photo_size=(1600, 1200)):
+        BaseHTTPServer.HTTPServer.__init__(self, address, FakePlacesHandler)
+        self.fixtures = dict(DEFAULT_FIXTURES, **(fixtures or {}))
+        self.latency = latency
+        self.error_rate = error_rate
+        self.photo_size = photo_size
+        self.requests = 0
+        self.bytes_sent = 0
+        self.lock = threading.Lock()
+        self._photo = None
+
+    @property
+    def base_url(self):
+        return 'http://%s:%d' % self.server_address[:2]
+
+    @classmethod
+    def from_file(cls, path, **kwargs):
+        with io.open(path, encoding='utf-8') as fixtures:
+            return cls(fixtures=json.load(fixtures), **kwargs)
+
+    def photo_bytes(self):
+        if self._photo is None:
+            image = Image.new('RGB', self.photo_size, (40, 90, 60))
+            output = io.BytesIO()
+            image.save(output, 'JPEG', quality=90)
+            self._photo = output.getvalue()
+        return self._photo
+
+    def record(self, sent):
+        with self.lock:
+            self.requests += 1
+            self.bytes_sent += sent
+
+    def start(self):
+        '''Serve from a daemon thread, returning the thread.'''
+        thread = threading.Thread(target=self.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return thread
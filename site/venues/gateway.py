@@ -0,0 +1,219 @@
+import random
+import threading
+import time
+
+import googlemaps
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+GMAPS_BASE_URL = 'https://maps.googleapis.com'
+PHOTO_URL = '/maps/api/place/photo'
+PHOTO_CHUNK_SIZE = 64 * 1024
+CLIENT_QUERIES_PER_SECOND = 1000
+
+
+class RedirectAdapter(HTTPAdapter):
+    '''Transport adapter that sends requests meant for the Maps API to
+    another server, such as the fake one in venues.fakeplaces.'''
+
+    def __init__(self, base_url, *args, **kwargs):
+        self.base_url = base_url.rstrip('/')
+        super(RedirectAdapter, self).__init__(*args, **kwargs)
+
+    def send(self, request, *args, **kwargs):
+        if request.url.startswith(GMAPS_BASE_URL):
+            request.url = self.base_url + request.url[len(GMAPS_BASE_URL):]
+        return super(RedirectAdapter, self).send(request, *args, **kwargs)
+
+
+class TokenBucket(object):
+    '''Thread safe token bucket. Tokens refill at `rate` per second up to
+    `capacity`, and acquire() blocks until one is available.'''
+
+    def __init__(self, rate, capacity):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self.tokens = self.capacity
+        self.updated = time.time()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.time()
+                self.tokens = min(
+                    self.capacity,
+                    self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class GatewayClient(googlemaps.Client):
+    '''Client that raises ApiError for over quota responses instead of
+    retrying them itself, leaving those retries to GmapsGateway.'''
+
+    def _get_body(self, response):
+        # Same checks as the client's own, with the body parsed once.
+        if response.status_code != 200:
+            raise googlemaps.exceptions.HTTPError(response.status_code)
+        body = response.json()
+        status = body['status']
+        if status in ('OK', 'ZERO_RESULTS'):
+            return body
+        raise googlemaps.exceptions.ApiError(
+            status, body.get('error_message'))
+
+
+class GmapsGateway(object):
+    '''Process wide entry point for the Google Maps API. Owns a single
+    client so the HTTP session is reused between calls, paces requests
+    with a token bucket and retries over quota responses with jittered
+    backoff. Counters are kept per operation, see stats().'''
+
+    def __init__(self, key, rate=10, burst=10, max_retries=3,
+                 retry_delay=0.5, timeout=10, retry_timeout=60,
+                 base_url=None):
+        # The client still retries 5xx responses within retry_timeout and
+        # raises Timeout once that runs out; over quota responses come
+        # back as ApiError for the gateway's own backoff and counters.
+        # The token bucket does the pacing, so the client's own limit is
+        # set far enough above it that it never waits.
+        self.client = GatewayClient(
+            key=key,
+            timeout=timeout,
+            retry_timeout=retry_timeout,
+            queries_per_second=CLIENT_QUERIES_PER_SECOND)
+        if base_url:
+            self.client.session.mount(
+                GMAPS_BASE_URL, RedirectAdapter(base_url))
+        self.bucket = TokenBucket(rate, burst)
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.lock = threading.Lock()
+        self.counters = {}
+
+    def place(self, place_id):
+        return self._call('place', self.client.place, place_id)
+
+    def places(self, search, **kwargs):
+        return self._call('places', self.client.places, search, **kwargs)
+
+    def places_photo(self, photo_reference, max_width, max_height,
+                     timeout=None):
+        '''Return the streamed response for the raw photo data, for the
+        caller to read with iter_content and close. The client's own
+        places_photo iterates a byte at a time, so the request is made
+        directly. timeout, when given, replaces the client's timeout for
+        connecting and for each read of the body.'''
+        params = {
+            'photoreference': photo_reference,
+            'maxwidth': max_width,
+            'maxheight': max_height,
+        }
+        requests_kwargs = {'stream': True}
+        if timeout:
+            requests_kwargs['timeout'] = timeout
+        return self._call(
+            'places_photo', self.client._request, PHOTO_URL, params,
+            extract_body=self._photo_body,
+            requests_kwargs=requests_kwargs)
+
+    @staticmethod
+    def _photo_body(response):
+        if response.status_code != 200:
+            response.close()
+            raise googlemaps.exceptions.HTTPError(response.status_code)
+        return response
+
+    def stats(self):
+        '''Snapshot of the per operation counters.'''
+        with self.lock:
+            return dict(
+                (name, dict(counter))
+                for name, counter in self.counters.items())
+
+    def _record(self, name, **increments):
+        with self.lock:
+            counter = self.counters.setdefault(name, {
+                'requests': 0,
+                'errors': 0,
+                'retries': 0,
+                'over_query_limit': 0,
+                'timeouts': 0,
+                'latency_total': 0.0,
+                'latency_max': 0.0,
+            })
+            for field, value in increments.items():
+                counter[field] += value
+            latency = increments.get('latency_total')
+            if latency and latency > counter['latency_max']:
+                counter['latency_max'] = latency
+
+    def _call(self, name, method, *args, **kwargs):
+        attempt = 0
+        while True:
+            self.bucket.acquire()
+            started = time.time()
+            try:
+                result = method(*args, **kwargs)
+            except googlemaps.exceptions.ApiError as e:
+                self._record(
+                    name, requests=1, latency_total=time.time() - started)
+                if e.status != 'OVER_QUERY_LIMIT':
+                    self._record(name, errors=1)
+                    raise
+                if attempt >= self.max_retries:
+                    self._record(name, errors=1, over_query_limit=1)
+                    raise
+                self._record(name, retries=1, over_query_limit=1)
+                delay = self.retry_delay * 2 ** attempt
+                time.sleep(delay + random.uniform(0, delay))
+                attempt += 1
+            except googlemaps.exceptions.Timeout:
+                self._record(
+                    name, requests=1, errors=1, timeouts=1,
+                    latency_total=time.time() - started)
+                raise
+            except Exception:
+                self._record(
+                    name, requests=1, errors=1,
+                    latency_total=time.time() - started)
+                raise
+            else:
+                self._record(
+                    name, requests=1, latency_total=time.time() - started)
+                return result
+
+
+_gateway = None
+_gateway_lock = threading.Lock()
+
+
+def get_gateway():
+    '''Return the process wide gateway, building it on first use.'''
+    global _gateway
+    if _gateway is None:
+        with _gateway_lock:
+            if _gateway is None:
+                _gateway = GmapsGateway(
+                    settings.GOOGLE_MAPS_PLACE_KEY,
+                    rate=getattr(settings, 'GOOGLE_MAPS_RATE', 10),
+                    burst=getattr(settings, 'GOOGLE_MAPS_BURST', 10),
+                    max_retries=getattr(settings, 'GOOGLE_MAPS_RETRIES', 3),
+                    timeout=getattr(settings, 'GOOGLE_MAPS_TIMEOUT', 10),
+                    retry_timeout=getattr(
+                        settings, 'GOOGLE_MAPS_RETRY_TIMEOUT', 60),
+                    base_url=getattr(settings, 'GOOGLE_MAPS_BASE_URL', None))
+    return _gateway
+
+
+def reset_gateway():
+    '''Drop the process wide gateway so the next call to get_gateway()
+    builds a new one from the current settings.'''
+    global _gateway
+    with _gateway_lock:
+        _gateway = None
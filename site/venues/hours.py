@@ -0,0 +1,50 @@
+import datetime
+import re
+
+import pytz
+from django.conf import settings
+
+DAY_MINUTES = 24 * 60
+WEEK_MINUTES = 7 * DAY_MINUTES
+OPEN_AT_RE = re.compile(r'^([0-6]):((?:[01][0-9]|2[0-3])[0-5][0-9])$')
+
+
+def week_minute(day, time):
+    '''Minutes since midnight Sunday for a gmaps day and 'HHMM' time.'''
+    return int(day) * DAY_MINUTES + int(time[:2]) * 60 + int(time[2:])
+
+
+def week_intervals(start, end):
+    '''Split a period into [start, end) minute-of-week intervals that don't
+    cross the end of the week. A period closing at or before the minute
+    it opens wraps past Saturday night.'''
+    if end > start:
+        return [(start, end)]
+    intervals = [(start, WEEK_MINUTES)]
+    if end > 0:
+        intervals.append((0, end))
+    return intervals
+
+
+def display_time(time):
+    return '%s:%s' % (time[:2], time[2:])
+
+
+def venue_now():
+    '''The current minute of the week in the venues' time zone.'''
+    zone = pytz.timezone(
+        getattr(settings, 'VENUE_TIME_ZONE', 'Australia/Melbourne'))
+    now = datetime.datetime.now(zone)
+    day = (now.weekday() + 1) % 7
+    return day * DAY_MINUTES + now.hour * 60 + now.minute
+
+
+def parse_open_at(value):
+    '''Minute of the week for 'now' or '<day>:<HHMM>', else None. The day
+    is 0 (Sunday) to 6 and the time a 24 hour HHMM.'''
+    if value == 'now':
+        return venue_now()
+    match = OPEN_AT_RE.match(value)
+    if match is None:
+        return None
+    return week_minute(match.group(1), match.group(2))
@@ -0,0 +1,126 @@
+import os
+import shutil
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+from wagtail.wagtailcore.models import Page
+
+from home.models import VenueIndexPage, VenuePage
+from venues.cache import places_cache
+from venues.fakeplaces import FakePlacesServer
+from venues.gateway import get_gateway, reset_gateway
+from venues.management.commands.fake_places_server import DEFAULT_RECORDING
+from venues.tasks import refresh_venue
+
+
+class Rollback(Exception):
+    pass
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    if not ordered:
+        return 0
+    index = int(round(fraction * (len(ordered) - 1)))
+    return ordered[index]
+
+
+def directory_size(path):
+    total = 0
+    for root, dirs, files in os.walk(path):
+        for name in files:
+            total += os.path.getsize(os.path.join(root, name))
+    return total
+
+
+class Command(BaseCommand):
+    help = ('Populate venues against the fake Places server and report '
+            'throughput, latency, queries and bytes written. Everything is '
+            'rolled back and written to a temporary media directory.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--venues', type=int, default=20)
+        parser.add_argument(
+            '--latency', type=float, default=50,
+            help='Milliseconds the fake server adds to each response.')
+        parser.add_argument(
+            '--error-rate', type=float, default=0,
+            help='Fraction of fake server responses that fail.')
+        parser.add_argument(
+            '--recording', default=os.path.normpath(DEFAULT_RECORDING))
+
+    def handle(self, *args, **options):
+        server = FakePlacesServer.from_file(
+            options['recording'],
+            latency=options['latency'] / 1000.0,
+            error_rate=options['error_rate'])
+        server.start()
+        media_root = tempfile.mkdtemp(prefix='venue-benchmark-')
+        try:
+            with override_settings(
+                    GOOGLE_MAPS_PLACE_KEY='AIzaBenchmark',
+                    GOOGLE_MAPS_BASE_URL=server.base_url,
+                    MEDIA_ROOT=media_root):
+                reset_gateway()
+                places_cache.local.clear()
+                timings, queries, failures = self.run(options['venues'])
+                stats = get_gateway().stats()
+            written = directory_size(media_root)
+        finally:
+            server.shutdown()
+            server.server_close()
+            shutil.rmtree(media_root, ignore_errors=True)
+            reset_gateway()
+            places_cache.local.clear()
+
+        self.report(timings, queries, failures, written, server, stats)
+
+    def run(self, count):
+        timings = []
+        queries = 0
+        failures = 0
+        try:
+            with transaction.atomic():
+                parent = (VenueIndexPage.objects.first() or
+                          Page.objects.get(depth=1))
+                pages = [parent.add_child(instance=VenuePage(
+                    title='Benchmark Venue %d' % number,
+                    slug='benchmark-venue-%d' % number))
+                    for number in range(count)]
+
+                for page in pages:
+                    started = time.time()
+                    with CaptureQueriesContext(connection) as captured:
+                        try:
+                            refresh_venue(page)
+                        except Exception as e:
+                            failures += 1
+                            self.stderr.write('%s: %r' % (page.title, e))
+                    timings.append(time.time() - started)
+                    queries += len(captured)
+                raise Rollback()
+        except Rollback:
+            pass
+        return timings, queries, failures
+
+    def report(self, timings, queries, failures, written, server, stats):
+        total = sum(timings)
+        count = len(timings)
+        write = self.stdout.write
+        write('Venues:        %d (%d failed)' % (count, failures))
+        write('Wall time:     %.2fs' % total)
+        write('Throughput:    %.2f venues/s' % (count / total if total else 0))
+        write('Latency p50:   %.1fms' % (percentile(timings, 0.5) * 1000))
+        write('Latency p95:   %.1fms' % (percentile(timings, 0.95) * 1000))
+        write('Queries:       %d (%.1f per venue)' % (
+            queries, queries / float(count) if count else 0))
+        write('Bytes written: %d' % written)
+        write('API requests:  %d (%d bytes served)' % (
+            server.requests, server.bytes_sent))
+        for name, counter in sorted(stats.items()):
+            write('  %-13s %d requests, %d retries, %d errors, max %.1fms' % (
+                name, counter['requests'], counter['retries'],
+                counter['errors'], counter['latency_max'] * 1000))
@@ -0,0 +1,40 @@
+import os
+
+from django.core.management.base import BaseCommand
+
+from venues.fakeplaces import FakePlacesServer
+
+DEFAULT_RECORDING = os.path.join(
+    os.path.dirname(__file__), os.pardir, os.pardir,
+    'recordings', 'fake_places.json')
+
+
+class Command(BaseCommand):
+    help = ('Serve recorded Places API responses locally. Point '
+            'GOOGLE_MAPS_BASE_URL at the printed address to use it.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument(
+            '--recording', default=os.path.normpath(DEFAULT_RECORDING),
+            help='JSON file of recorded search and details responses.')
+        parser.add_argument(
+            '--latency', type=float, default=0,
+            help='Milliseconds added to every response.')
+        parser.add_argument(
+            '--error-rate', type=float, default=0,
+            help='Fraction of requests that fail, from 0 to 1.')
+
+    def handle(self, *args, **options):
+        server = FakePlacesServer.from_file(
+            options['recording'],
+            address=('127.0.0.1', options['port']),
+            latency=options['latency'] / 1000.0,
+            error_rate=options['error_rate'])
+        self.stdout.write('Serving fake Places API on %s' % server.base_url)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
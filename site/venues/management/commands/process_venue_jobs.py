@@ -0,0 +1,45 @@
+import time
+import traceback
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from venues.models import VenueJob
+from venues.tasks import refresh_venue
+
+
+class Command(BaseCommand):
+    help = 'Drain the venue refresh queue populated by page publishes.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Exit once the queue is empty instead of polling.')
+        parser.add_argument(
+            '--sleep', type=float, default=5,
+            help='Seconds to wait between polls of an empty queue.')
+
+    def handle(self, *args, **options):
+        while True:
+            # Drop connections the database has closed or that are past
+            # CONN_MAX_AGE, as the request cycle does between requests.
+            close_old_connections()
+            VenueJob.objects.reclaim_stale()
+            job = VenueJob.objects.claim()
+            if job is None:
+                if options['once']:
+                    return
+                time.sleep(options['sleep'])
+                continue
+            self.run_job(job)
+
+    def run_job(self, job):
+        try:
+            refresh_venue(job.venue_page.specific)
+        except Exception:
+            job.mark_failed(traceback.format_exc())
+            self.stderr.write('Failed %s (attempt %d)' % (
+                job.venue_page, job.attempts))
+        else:
+            job.mark_done()
+            self.stdout.write('Refreshed %s' % job.venue_page)
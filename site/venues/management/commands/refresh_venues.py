@@ -0,0 +1,113 @@
+import logging
+from multiprocessing.pool import ThreadPool
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from home.models import VenuePage
+from venues.models import VenueDetails
+from venues.tasks import apply_place, fetch_photos, fetch_place
+
+logger = logging.getLogger(__name__)
+
+CURSOR_KEY = 'venues:refresh_venues:cursor'
+# Stands in for the place of a venue whose lookup raised.
+FAILED = object()
+
+
+def fetch(venue_page):
+    '''Look up a venue's place, returning FAILED rather than raising so
+    one bad lookup doesn't stop the run.'''
+    try:
+        return fetch_place(venue_page.title, force=True)
+    except Exception:
+        logger.warning(
+            'Places lookup failed for %s', venue_page.title, exc_info=True)
+        return FAILED
+    finally:
+        # Pool threads each open their own connection for the cache.
+        connection.close()
+
+
+class Command(BaseCommand):
+    help = ('Re-sync every live venue page with Places, skipping venues '
+            'whose details haven\'t changed.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=50)
+        parser.add_argument(
+            '--workers', type=int, default=4,
+            help='Concurrent Places lookups per batch.')
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Report what would change without writing anything.')
+        parser.add_argument(
+            '--resume', action='store_true',
+            help='Continue after the last batch an interrupted run '
+                 'committed.')
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        cursor = cache.get(CURSOR_KEY, 0) if options['resume'] else 0
+        pages = VenuePage.objects.live().order_by('pk')
+        total = pages.count()
+        done = pages.filter(pk__lte=cursor).count()
+        counts = {'changed': 0, 'unchanged': 0, 'missing': 0, 'failed': 0}
+
+        pool = ThreadPool(options['workers'])
+        try:
+            while True:
+                batch = list(pages.filter(pk__gt=cursor).select_related(
+                    'venue_details')[:options['batch_size']])
+                if not batch:
+                    break
+                places = pool.map(fetch, batch)
+                self.apply_batch(batch, places, counts, dry_run)
+                cursor = batch[-1].pk
+                done += len(batch)
+                if not dry_run:
+                    cache.set(CURSOR_KEY, cursor, None)
+                self.stdout.write(
+                    '%d/%d venues: %d changed, %d unchanged, %d not found, '
+                    '%d failed' % (
+                        done, total, counts['changed'], counts['unchanged'],
+                        counts['missing'], counts['failed']))
+        finally:
+            pool.terminate()
+
+        if not dry_run:
+            cache.delete(CURSOR_KEY)
+
+    def apply_batch(self, batch, places, counts, dry_run):
+        changed = []
+        for venue_page, place in zip(batch, places):
+            if place is FAILED:
+                counts['failed'] += 1
+                continue
+            if not place:
+                counts['missing'] += 1
+                continue
+            try:
+                stored = venue_page.venue_details.content_hash
+            except VenueDetails.DoesNotExist:
+                stored = None
+            if stored == VenueDetails.objects.place_hash(place):
+                counts['unchanged'] += 1
+                continue
+            counts['changed'] += 1
+            if dry_run:
+                self.stdout.write('Would refresh %s' % venue_page.title)
+            else:
+                changed.append((venue_page, place, fetch_photos(place)))
+
+        # Each venue commits on its own, so the photo resizing in
+        # apply_place never runs with a write transaction open.
+        for venue_page, place, labels in changed:
+            try:
+                apply_place(venue_page, place, labels)
+            except Exception:
+                logger.warning(
+                    'Refresh failed for %s', venue_page.title, exc_info=True)
+                counts['changed'] -= 1
+                counts['failed'] += 1
@@ -0,0 +1,49 @@
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from venues.models import VenueImage, VenueImageVariant
+
+
+class Command(BaseCommand):
+    help = ('Remove files under MEDIA_ROOT/gmaps_images that no VenueImage '
+            'or VenueImageVariant refers to.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='List the stray files without removing them.')
+        parser.add_argument(
+            '--min-age', type=int, default=60 * 60,
+            help='Seconds a file must be untouched before it is removed, '
+                 'so downloads still waiting on their rows are kept.')
+
+    def handle(self, *args, **options):
+        referenced = set(
+            VenueImage.objects.values_list('photo', flat=True).iterator())
+        referenced.update(
+            VenueImageVariant.objects.values_list(
+                'photo', flat=True).iterator())
+
+        root = os.path.join(settings.MEDIA_ROOT, 'gmaps_images')
+        cutoff = time.time() - options['min_age']
+        removed = 0
+        for directory, dirs, files in os.walk(root):
+            for filename in files:
+                path = os.path.join(directory, filename)
+                name = os.path.relpath(path, settings.MEDIA_ROOT)
+                if name.replace(os.sep, '/') in referenced:
+                    continue
+                if os.path.getmtime(path) > cutoff:
+                    continue
+                removed += 1
+                if options['dry_run']:
+                    self.stdout.write('Would remove %s' % name)
+                else:
+                    os.remove(path)
+
+        self.stdout.write('%d stray file%s %s' % (
+            removed, '' if removed == 1 else 's',
+            'found' if options['dry_run'] else 'removed'))
@@ -1,34 +1,66 @@
 from __future__ import unicode_literals
 
-from django.db import models
+import hashlib
+import json
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import models, transaction
+from django.utils import timezone
 from home.models import VenuePage
-import random
+from venues.hours import display_time, week_intervals, week_minute
 
 
 class VenueDetailsManager(models.Manager):
+    # Bumped when the way a place is stored changes, so the next refresh
+    # rewrites every venue rather than skipping it as unchanged.
+    PAYLOAD_VERSION = 2
+    PLACE_FIELDS = (
+        ('place_id', 'place_id'),
+        ('address', 'formatted_address'),
+        ('phone', 'formatted_phone_number'),
+        ('website', 'website'),
+        ('gmaps_url', 'url'))
+
+    def place_hash(self, place):
+        '''Hash of the parts of a Places result the venue is built from.
+        Photo references are rotated by gmaps on every request, so photos
+        are compared by their dimensions instead.'''
+        normalized = dict(
+            (field, place.get(key, '')) for field, key in self.PLACE_FIELDS)
+        normalized['version'] = self.PAYLOAD_VERSION
+        normalized['location'] = place.get(
+            'geometry', {}).get('location', {})
+        normalized['periods'] = place.get(
+            'opening_hours', {}).get('periods', [])
+        normalized['photos'] = [
+            (photo.get('width'), photo.get('height'))
+            for photo in place.get('photos', [])[:6]]
+        payload = json.dumps(normalized, sort_keys=True)
+        return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
     def create_venue(self, venue_page, place):
-        venue, created = self.update_or_create(venue_page=venue_page)
-        try:
-            venue.place_id = place['place_id']
-        except:
-            pass
-        try:
-            venue.address = place['formatted_address']
-        except:
-            pass
+        '''Create or update the venue's details from a Places result in
+        at most one write, returning the venue. The content hash is left
+        for the caller to store once everything else built from the
+        place has been written.'''
+        values = dict(
+            (field, place.get(key, '')) for field, key in self.PLACE_FIELDS)
+        location = place.get('geometry', {}).get('location', {})
+        values['lat'] = location.get('lat')
+        values['lng'] = location.get('lng')
         try:
-            venue.phone = place['formatted_phone_number']
-        except:
-            pass
-        try:
-            venue.website = place['website']
-        except:
-            pass
-        try:
-            venue.gmaps_url = place['url']
-        except:
-            pass
-        venue.save()
+            venue = self.get(venue_page=venue_page)
+        except self.model.DoesNotExist:
+            return self.create(venue_page=venue_page, **values)
+
+        changed = [
+            field for field, value in values.items()
+            if getattr(venue, field) != value]
+        for field in changed:
+            setattr(venue, field, values[field])
+        venue.save(update_fields=changed)
         return venue
 
 
@@ -44,26 +76,74 @@ class VenueDetails(models.Model):
     phone = models.CharField(max_length=30, blank=True)
     website = models.CharField(max_length=100, blank=True)
     gmaps_url = models.CharField(max_length=100, blank=True)
+    lat = models.FloatField(null=True, blank=True)
+    lng = models.FloatField(null=True, blank=True)
+    content_hash = models.CharField(max_length=40, blank=True)
 
     objects = VenueDetailsManager()
 
 
 class OpenHoursManager(models.Manager):
-    def create_openhours(self, venue, day):
-        try: 
-            open_hours_id = (str(day['open']['day']) + day['open']['time'] +
-                            str(day['close']['day']) + day['close']['time'] +
-                            str(random.randint(1,100000)))
-            open_hours, created = self.update_or_create(
-                uuid=open_hours_id,
-                venue=venue)
-            open_hours.open_day = day['open']['day']
-            open_hours.open_time = day['open']['time']
-            open_hours.close_day = day['close']['day']
-            open_hours.close_time = day['close']['time']
-            open_hours.save()
-        except KeyError:
-            pass
+    def period_key(self, venue, day):
+        '''Deterministic primary key for a period. The key encodes every
+        field of the period, so an existing key never needs updating.'''
+        return '%s-%s%s-%s%s' % (
+            venue.pk,
+            day['open']['day'], day['open']['time'],
+            day['close']['day'], day['close']['time'])
+
+    def sync_openhours(self, venue, periods):
+        '''Bring the venue's stored hours in line with the gmaps periods
+        using one delete and one bulk insert each for the hours and their
+        intervals, whatever the period count.'''
+        incoming = OrderedDict()
+        for day in periods:
+            try:
+                close_display = display_time(day['close']['time'])
+            except KeyError:
+                # gmaps gives a venue open around the clock one period
+                # with no close. Closing at the minute it opens covers the
+                # whole week.
+                if 'open' not in day:
+                    continue
+                day = dict(day, close=day['open'])
+                close_display = '24:00'
+            try:
+                key = self.period_key(venue, day)
+                incoming[key] = self.model(
+                    uuid=key,
+                    venue=venue,
+                    open_day=day['open']['day'],
+                    open_time=day['open']['time'],
+                    close_day=day['close']['day'],
+                    close_time=day['close']['time'],
+                    open_display=display_time(day['open']['time']),
+                    close_display=close_display)
+            except KeyError:
+                pass
+
+        with transaction.atomic():
+            # Rows stored before the display strings and intervals were
+            # added are replaced along with the stale ones.
+            existing = set()
+            stale = set()
+            for key, open_display in self.filter(venue=venue).values_list(
+                    'uuid', 'open_display'):
+                if key in incoming and open_display:
+                    existing.add(key)
+                else:
+                    stale.add(key)
+            if stale:
+                self.filter(venue=venue, uuid__in=stale).delete()
+            created = [
+                open_hours for key, open_hours in incoming.items()
+                if key not in existing]
+            self.bulk_create(created)
+            OpenInterval.objects.bulk_create([
+                OpenInterval(
+                    period=open_hours, venue=venue, start=start, end=end)
+                for open_hours in created
+                for start, end in open_hours.week_intervals()])
 
 
 class OpenHours(models.Model):
@@ -77,7 +157,7 @@ class OpenHours(models.Model):
         ('4', 'Thursday'),
         ('5', 'Friday'),
         ('6', 'Saturday'))
-    uuid = models.CharField(max_length=20, primary_key=True)
+    uuid = models.CharField(max_length=40, primary_key=True)
     venue = models.ForeignKey(
         VenueDetails,
         related_name='openhours',
@@ -90,15 +170,43 @@ class OpenHours(models.Model):
         max_length=1,
         choices=DAY_OF_WEEK_CHOICES)
     close_time = models.CharField(max_length=10)
+    open_display = models.CharField(max_length=5, blank=True)
+    close_display = models.CharField(max_length=5, blank=True)
 
     objects = OpenHoursManager()
 
+    def week_intervals(self):
+        return week_intervals(
+            week_minute(self.open_day, self.open_time),
+            week_minute(self.close_day, self.close_time))
+
+
+class OpenInterval(models.Model):
+    '''Model for an OpenHours period as a [start, end) range of minutes
+    since midnight Sunday, so venues open at a given minute can be found
+    with one indexed range query. Periods crossing the end of the week
+    are stored as two intervals.'''
+    period = models.ForeignKey(
+        OpenHours,
+        related_name='intervals',
+        on_delete=models.CASCADE)
+    venue = models.ForeignKey(
+        VenueDetails,
+        related_name='open_intervals',
+        on_delete=models.CASCADE)
+    start = models.PositiveIntegerField()
+    end = models.PositiveIntegerField()
+
+    class Meta:
+        index_together = [('start', 'end')]
+
 
 class VenueImageManager(models.Manager):
     def create_venueimage(self, venue, label):
         venue_image = self.create(venue=venue)
         venue_image.photo = label
         venue_image.save()
+        return venue_image
 
 
 class VenueImage(models.Model):
@@ -114,3 +222,164 @@ class VenueImage(models.Model):
     )
 
     objects = VenueImageManager()
+
+    def srcset(self, image_format='jpeg'):
+        '''Build a srcset attribute value from the image's variants.'''
+        return ', '.join(
+            '%s %dw' % (variant.photo.url, variant.width)
+            for variant in self.variants.all()
+            if variant.format == image_format)
+
+
+class VenueImageVariant(models.Model):
+    '''Model for the resized copies of a VenueImage
+    generated for responsive image markup'''
+    FORMAT_CHOICES = (
+        ('webp', 'WebP'),
+        ('jpeg', 'JPEG'))
+    venue_image = models.ForeignKey(
+        VenueImage,
+        related_name='variants',
+        on_delete=models.CASCADE)
+    photo = models.ImageField(
+        upload_to='gmaps_images/variants/',
+        max_length=300)
+    width = models.PositiveIntegerField()
+    format = models.CharField(max_length=4, choices=FORMAT_CHOICES)
+
+    class Meta:
+        ordering = ['width']
+
+
+class VenueJobManager(models.Manager):
+    def lock_page(self, venue_page_id):
+        '''Lock the venue page row until the end of the transaction, so
+        checking for a pending job and then creating or reviving one
+        can't interleave with another process doing the same.'''
+        list(VenuePage.objects.select_for_update().filter(
+            pk=venue_page_id).values_list('pk', flat=True))
+
+    def enqueue(self, venue_page):
+        '''Queue a refresh for the venue page. A page that already has a
+        pending job keeps that job rather than stacking another one.'''
+        with transaction.atomic():
+            self.lock_page(venue_page.pk)
+            job = self.filter(
+                venue_page=venue_page,
+                status=VenueJob.PENDING).order_by('pk').first()
+            if job is None:
+                job = self.create(venue_page=venue_page)
+        return job
+
+    def has_pending(self, venue_page_id, exclude=None):
+        '''Whether the venue page has a pending job other than exclude.'''
+        return self.filter(
+            venue_page_id=venue_page_id,
+            status=VenueJob.PENDING).exclude(pk=exclude).exists()
+
+    def reclaim_stale(self):
+        '''Return jobs left running by a worker that died back to the
+        queue once their lease has expired. A job whose page was queued
+        again in the meantime is closed instead, so a page never has two
+        pending jobs.'''
+        lease = getattr(settings, 'VENUE_JOB_LEASE', 600)
+        cutoff = timezone.now() - timedelta(seconds=lease)
+        stale = self.filter(status=VenueJob.RUNNING, locked_at__lt=cutoff)
+        reclaimed = 0
+        for pk, venue_page_id in stale.values_list('pk', 'venue_page_id'):
+            with transaction.atomic():
+                self.lock_page(venue_page_id)
+                if self.has_pending(venue_page_id, exclude=pk):
+                    status = VenueJob.DONE
+                else:
+                    status = VenueJob.PENDING
+                reclaimed += self.filter(
+                    pk=pk,
+                    status=VenueJob.RUNNING,
+                    locked_at__lt=cutoff).update(
+                        status=status,
+                        locked_at=None)
+        return reclaimed
+
+    def claim(self):
+        '''Take the next due job off the queue. The conditional update
+        means two workers can never claim the same job.'''
+        now = timezone.now()
+        due = self.filter(
+            status=VenueJob.PENDING,
+            run_after__lte=now).order_by('run_after', 'pk')
+        for job in due[:10]:
+            claimed = self.filter(
+                pk=job.pk,
+                status=VenueJob.PENDING).update(
+                    status=VenueJob.RUNNING,
+                    locked_at=now,
+                    attempts=models.F('attempts') + 1)
+            if claimed:
+                return self.get(pk=job.pk)
+        return None
+
+
+class VenueJob(models.Model):
+    '''Model for queueing venue refreshes so the Places lookups
+    and photo downloads happen outside of the publish request.'''
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = (
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'))
+    venue_page = models.ForeignKey(
+        VenuePage,
+        related_name='venue_jobs',
+        on_delete=models.CASCADE)
+    status = models.CharField(
+        max_length=10,
+        choices=STATUS_CHOICES,
+        default=PENDING,
+        db_index=True)
+    attempts = models.PositiveIntegerField(default=0)
+    run_after = models.DateTimeField(default=timezone.now, db_index=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = VenueJobManager()
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __unicode__(self):
+        return '%s (%s)' % (self.venue_page, self.status)
+
+    def mark_done(self):
+        self.status = self.DONE
+        self.locked_at = None
+        self.last_error = ''
+        self.save()
+
+    def mark_failed(self, error):
+        '''Push the job back with exponential backoff, or give up once it
+        has used all of its attempts.'''
+        max_attempts = getattr(settings, 'VENUE_JOB_MAX_ATTEMPTS', 5)
+        delay = getattr(settings, 'VENUE_JOB_RETRY_DELAY', 60)
+        self.last_error = error
+        self.locked_at = None
+        with transaction.atomic():
+            VenueJob.objects.lock_page(self.venue_page_id)
+            if self.attempts >= max_attempts:
+                self.status = self.FAILED
+            elif VenueJob.objects.has_pending(
+                    self.venue_page_id, exclude=self.pk):
+                # The page was queued again while this job ran; that job
+                # covers the retry.
+                self.status = self.DONE
+            else:
+                self.status = self.PENDING
+                backoff = delay * 2 ** (self.attempts - 1)
+                self.run_after = timezone.now() + timedelta(seconds=backoff)
+            self.save()
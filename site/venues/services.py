@@ -1,21 +1,33 @@
 import googlemaps
-from django.conf import settings
-from django.core.cache import cache
+from venues.cache import places_cache
+from venues.gateway import get_gateway
 
 
-def get_gmaps_place(place_id):
-    '''Given a gmaps place_id, get the place's details and return.'''
-    gmaps = googlemaps.Client(key=settings.GOOGLE_MAPS_PLACE_KEY)
+# Answers that say something about the place itself and won't change on
+# retry. Anything else, such as UNKNOWN_ERROR or REQUEST_DENIED, is raised
+# so it is never cached.
+NEGATIVE_STATUSES = ('NOT_FOUND', 'ZERO_RESULTS', 'INVALID_REQUEST')
 
-    cached = cache.get(place_id)
-    query = None
-    if not cached:
-        query = gmaps.place(place_id)
-        if query['status'] == 'OK':
-            cache.set(place_id, query, 10080)
-    else:
-        query = cached
-    return query['result']
+
+def _negative(method, *args, **kwargs):
+    '''Call a gateway method, turning a definite answer from gmaps such as
+    NOT_FOUND into a response the places cache can store.'''
+    try:
+        return method(*args, **kwargs)
+    except googlemaps.exceptions.ApiError as e:
+        if e.status not in NEGATIVE_STATUSES:
+            raise
+        return {'status': e.status}
+
+
+def get_gmaps_place(place_id, force=False):
+    '''Given a gmaps place_id, get the place's details and return.
+    Returns None when gmaps doesn't have a result for the place_id.'''
+    query = places_cache.get(
+        'place', place_id,
+        lambda: _negative(get_gateway().place, place_id),
+        force=force)
+    return query.get('result')
 
 
 def search_gmaps_place(search):
@@ -23,25 +35,21 @@ def search_gmaps_place(search):
     gmaps API within 50,000 meters of Melbourne and return the results.'''
     radius = 50000
     lat_long = (-37.813611, 144.963056)
-    gmaps = googlemaps.Client(key=settings.GOOGLE_MAPS_PLACE_KEY)
-
-    cached = cache.get(search)
-    query = None
-    if not cached:
-        query = gmaps.places(search, location=lat_long, radius=radius)
-        if query['status'] == 'OK':
-            cache.set(search, query, 10080)
-    else:
-        query = cached
-    return query['results']
-
-
-def get_gmaps_image(photo_reference):
-    '''Given a photo refernce ID, query the
-    gmaps API and return raw photo data'''
-    gmaps = googlemaps.Client(key=settings.GOOGLE_MAPS_PLACE_KEY)
+    query = places_cache.get(
+        'search', search,
+        lambda: _negative(
+            get_gateway().places,
+            search, location=lat_long, radius=radius))
+    return query.get('results', [])
+
+
+def get_gmaps_image(photo_reference, timeout=None):
+    '''Given a photo refernce ID, query the gmaps API and return the
+    streamed response for the raw photo data'''
+    gmaps = get_gateway()
     query = gmaps.places_photo(
         photo_reference,
         max_width=2000,
-        max_height=2000)
+        max_height=2000,
+        timeout=timeout)
     return query
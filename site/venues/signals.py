@@ -1,36 +1,33 @@
-from venues.models import VenueDetails, OpenHours, VenueImage
-from venues.utilities import get_and_write_image
-from venues.services import search_gmaps_place, get_gmaps_place
+import logging
+
+from django.db import transaction
+from venues.models import VenueJob
+
+logger = logging.getLogger(__name__)
 
 
 # signal picks up model save here
 def populate_venue(sender, **kwargs):
-    '''Signal method for populating the models related to VenuePage'''
+    '''Signal method for queueing a refresh of the models related to
+    VenuePage. The work itself is done by the process_venue_jobs command.'''
     instance = kwargs['instance']
-    place_id = search_gmaps_place(instance.title)[0]['place_id']
-    if place_id:
-        place = get_gmaps_place(place_id)
-
-    if place:
-        venue = VenueDetails.objects.create_venue(instance, place)
+    VenueJob.objects.enqueue(instance)
 
-        if 'opening_hours' in place:
-            for day in place['opening_hours']['periods']:
-                OpenHours.objects.create_openhours(venue, day)
 
-        if 'photos' in place:
-            label_num = 0
-            for photo in place['photos'][:6]:
-                name = place['place_id'] + str(label_num)
-                label_num += 1
-                label = get_and_write_image(photo['photo_reference'], name)
-                VenueImage.objects.create_venueimage(venue, label)
+def delete_file(storage, name):
+    try:
+        storage.delete(name)
+    except OSError:
+        logger.warning('Could not remove %s', name, exc_info=True)
 
 
 def remove_image(sender, **kwargs):
-    '''Signal method for removing downloaded
-    images after parent model is removed.'''
+    '''Signal method for removing downloaded images after parent model
+    is removed. Each file is removed once the delete commits; registering
+    one callback per file lets Django drop it if the savepoint around the
+    delete is rolled back, so the file stays with its restored row.'''
     instance = kwargs['instance']
-    storage = instance.photo.storage
-    path = instance.photo.path
-    storage.delete(path)
+    if not instance.photo:
+        return
+    storage, name = instance.photo.storage, instance.photo.name
+    transaction.on_commit(lambda: delete_file(storage, name))
@@ -0,0 +1,111 @@
+import heapq
+import math
+
+from home.versioned_cache import VersionedCache
+
+VERSION_KEY = 'venues:spatial:version'
+EARTH_RADIUS_KM = 6371.0
+
+
+def to_xyz(lat, lng):
+    '''Unit vector for a point on the globe. Straight line distance
+    between these orders points the same as great circle distance.'''
+    lat, lng = math.radians(lat), math.radians(lng)
+    return (
+        math.cos(lat) * math.cos(lng),
+        math.cos(lat) * math.sin(lng),
+        math.sin(lat))
+
+
+def chord_to_km(squared_chord):
+    chord = math.sqrt(squared_chord)
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, chord / 2))
+
+
+class KDTree(object):
+    '''Static 3d tree over (point, item) pairs with k nearest search.'''
+
+    def __init__(self, entries):
+        self.root = self._build(list(entries), 0)
+
+    def _build(self, entries, depth):
+        if not entries:
+            return None
+        axis = depth % 3
+        entries.sort(key=lambda entry: entry[0][axis])
+        middle = len(entries) // 2
+        return (
+            entries[middle],
+            axis,
+            self._build(entries[:middle], depth + 1),
+            self._build(entries[middle + 1:], depth + 1))
+
+    def nearest(self, point, k):
+        '''Return up to k (squared distance, item) pairs, nearest first.'''
+        heap = []
+        self._search(self.root, point, k, heap)
+        heap.sort(reverse=True)
+        return [(-distance, item) for distance, order, item in heap]
+
+    def _search(self, node, point, k, heap):
+        if node is None:
+            return
+        (node_point, item), axis, left, right = node
+        distance = sum((a - b) ** 2 for a, b in zip(node_point, point))
+        # id() breaks ties so items themselves are never compared.
+        entry = (-distance, id(item), item)
+        if len(heap) < k:
+            heapq.heappush(heap, entry)
+        elif distance < -heap[0][0]:
+            heapq.heapreplace(heap, entry)
+
+        offset = point[axis] - node_point[axis]
+        near, far = (left, right) if offset < 0 else (right, left)
+        self._search(near, point, k, heap)
+        if len(heap) < k or offset ** 2 < -heap[0][0]:
+            self._search(far, point, k, heap)
+
+
+class VenueSpatialIndex(VersionedCache):
+    '''In process index of live venues by location. It is rebuilt lazily
+    when the shared version key has been bumped by another process.'''
+
+    version_key = VERSION_KEY
+    interval_setting = 'VENUE_SPATIAL_CHECK_INTERVAL'
+    default_interval = 30
+
+    def build(self):
+        from home.models import VenuePage
+
+        entries = []
+        venues = VenuePage.objects.live().filter(
+            venue_details__lat__isnull=False).select_related('venue_details')
+        for venue in venues:
+            details = venue.venue_details
+            entries.append((to_xyz(details.lat, details.lng), {
+                'id': venue.pk,
+                'title': venue.title,
+                'url': venue.url,
+                'address': details.address,
+            }))
+        return KDTree(entries)
+
+    def get_tree(self):
+        return self.fetch('tree', self.build)
+
+    def nearest(self, lat, lng, k=5):
+        results = []
+        for distance, venue in self.get_tree().nearest(to_xyz(lat, lng), k):
+            result = dict(venue)
+            result['distance_km'] = round(chord_to_km(distance), 3)
+            results.append(result)
+        return results
+
+
+def invalidate_spatial_index(*args, **kwargs):
+    '''Bump the shared version so every process rebuilds its index.
+    Usable directly or as a signal receiver.'''
+    venue_index.bump()
+
+
+venue_index = VenueSpatialIndex()
@@ -0,0 +1,75 @@
+from django.db import transaction
+
+from venues.derivatives import save_variants, write_variants
+from venues.models import VenueDetails, OpenHours, VenueImage
+from venues.spatial import invalidate_spatial_index
+from venues.utilities import get_and_write_images
+from venues.services import search_gmaps_place, get_gmaps_place
+
+PHOTO_LIMIT = 6
+
+
+def fetch_place(title, force=False):
+    '''Search gmaps for a venue title and return the details of the best
+    match, or None. force bypasses the cached details.'''
+    results = search_gmaps_place(title)
+    if not results:
+        return None
+    return get_gmaps_place(results[0]['place_id'], force=force)
+
+
+def fetch_photos(place):
+    '''Download the place's photos, returning their labels.'''
+    if 'photos' not in place:
+        return []
+    return get_and_write_images(
+        place['photos'][:PHOTO_LIMIT], place['place_id'])
+
+
+def apply_place(venue_page, place, labels=None):
+    '''Populate the models related to the VenuePage from a place. Nothing
+    is touched when the stored hash shows the place hasn't changed.
+    Returns the venue and whether it changed.
+
+    Photos are downloaded and resized first, then everything is written
+    in one transaction with the hash last. The hash is only stored once every
+    photo was written, so a refresh that fails or skips a photo part way
+    is redone in full next time.'''
+    content_hash = VenueDetails.objects.place_hash(place)
+    venue = VenueDetails.objects.filter(venue_page=venue_page).first()
+    if venue is not None and venue.content_hash == content_hash:
+        return venue, False
+
+    if labels is None:
+        labels = fetch_photos(place)
+    existing = set(VenueImage.objects.filter(
+        venue__venue_page=venue_page).values_list('photo', flat=True))
+    variants = [
+        (label, write_variants(label))
+        for label in labels if label not in existing]
+
+    with transaction.atomic():
+        venue = VenueDetails.objects.create_venue(venue_page, place)
+        OpenHours.objects.sync_openhours(
+            venue, place.get('opening_hours', {}).get('periods', []))
+
+        for label, written in variants:
+            venue_image = VenueImage.objects.create_venueimage(venue, label)
+            save_variants(venue_image, written)
+
+        if len(labels) >= len(place.get('photos', [])[:PHOTO_LIMIT]):
+            VenueDetails.objects.filter(pk=venue.pk).update(
+                content_hash=content_hash)
+            venue.content_hash = content_hash
+        transaction.on_commit(invalidate_spatial_index)
+    return venue, True
+
+
+def refresh_venue(venue_page):
+    '''Search gmaps for the venue page's title and populate
+    the models related to the VenuePage from the result.'''
+    place = fetch_place(venue_page.title)
+    if not place:
+        return None
+    venue, changed = apply_place(venue_page, place)
+    return venue
@@ -1,24 +1,110 @@
+import logging
 import os
+import tempfile
+import time
+from multiprocessing.pool import ThreadPool
+
 from django.conf import settings
+from venues.gateway import PHOTO_CHUNK_SIZE
 from venues.services import get_gmaps_image
 
+logger = logging.getLogger(__name__)
+
+
+class PhotoTimeout(Exception):
+    '''Raised when a single photo download runs past its deadline.'''
+
 
-def get_and_write_image(photo_reference, name):
+def get_and_write_image(photo_reference, name, timeout=None):
     '''Given a photo reference and filepath for the image, get data from gmaps
-    and write the file to the media directory for eventual storage in django
-    model. Return the file name for use in the parent function.'''
+    and write it to a temp file alongside its place in the media directory.
+    Return the label for use in the django model and the temp file's path,
+    which is None when the image is already in place.
+
+    Nothing is put in place until the caller passes the pair to
+    commit_image, so a failed or timed out download never leaves a partial
+    image where the model expects a complete one. timeout bounds the
+    request's connect and each read as well as the whole body.'''
     gmaps_path = 'gmaps_images'
     extension = '.jpeg'
     filename = name + extension
     label = os.path.join(gmaps_path, filename)
+    target = os.path.join(settings.MEDIA_ROOT, label)
+
+    if os.path.exists(target):
+        return label, None
+
+    directory = os.path.dirname(target)
+    if not os.path.isdir(directory):
+        try:
+            os.makedirs(directory)
+        except OSError:
+            if not os.path.isdir(directory):
+                raise
+
+    deadline = time.time() + timeout if timeout else None
+    work = tempfile.NamedTemporaryFile(
+        dir=directory, prefix='.' + name, suffix='.part', delete=False)
+    try:
+        with work:
+            response = get_gmaps_image(photo_reference, timeout)
+            try:
+                for chunk in response.iter_content(PHOTO_CHUNK_SIZE):
+                    if chunk:
+                        work.write(chunk)
+                    if deadline and time.time() > deadline:
+                        raise PhotoTimeout(label)
+            finally:
+                response.close()
+    except Exception:
+        os.remove(work.name)
+        raise
+    return label, work.name
+
+
+def commit_image(label, part):
+    '''Move a downloaded photo from its temp file into place.'''
+    if part is not None:
+        os.rename(part, os.path.join(settings.MEDIA_ROOT, label))
+    return label
+
+
+def get_and_write_images(photos, place_id, workers=None, timeout=None):
+    '''Download every photo for a place at once using a bounded pool of
+    threads. Returns the labels of the photos that were written, in the
+    order of the photos given. Photos that fail or time out are skipped.
+
+    Each download enforces its own timeout, so the pool is joined rather
+    than abandoned and only the photos that finished are put in place.'''
+    if workers is None:
+        workers = getattr(settings, 'VENUE_PHOTO_WORKERS', 6)
+    if timeout is None:
+        timeout = getattr(settings, 'VENUE_PHOTO_TIMEOUT', 30)
+    if not photos:
+        return []
+
+    started = time.time()
+    pool = ThreadPool(min(workers, len(photos)))
+    try:
+        pending = []
+        for label_num, photo in enumerate(photos):
+            name = place_id + str(label_num)
+            pending.append(pool.apply_async(
+                get_and_write_image,
+                (photo['photo_reference'], name, timeout)))
+
+        labels = []
+        for result in pending:
+            try:
+                labels.append(commit_image(*result.get()))
+            except Exception:
+                logger.warning(
+                    'Photo download failed for %s', place_id, exc_info=True)
+    finally:
+        pool.close()
+        pool.join()
 
-    if os.path.exists(os.path.join(settings.MEDIA_ROOT, label)):
-        return label
-    else:
-        image = get_gmaps_image(photo_reference)
-        with open(os.path.join(settings.MEDIA_ROOT, label), 'wb') as work:
-            for chunk in image:
-                if chunk:
-                    work.write(chunk)
-            work.close()
-        return label
+    logger.info(
+        'Fetched %d/%d photos for %s in %.2fs',
+        len(labels), len(photos), place_id, time.time() - started)
+    return labels
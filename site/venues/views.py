@@ -1,3 +1,21 @@
-from django.shortcuts import render
+from django.http import HttpResponseBadRequest, JsonResponse
 
-# Create your views here.
+from venues.spatial import venue_index
+
+MAX_NEAREST = 50
+
+
+def nearby(request):
+    '''Return the k venues nearest to the lat/lng in the query string.'''
+    try:
+        lat = float(request.GET['lat'])
+        lng = float(request.GET['lng'])
+        k = int(request.GET.get('k', 5))
+    except (KeyError, ValueError):
+        return HttpResponseBadRequest('lat and lng are required numbers')
+    if not (-90 <= lat <= 90 and -180 <= lng <= 180) or k < 1:
+        return HttpResponseBadRequest('lat, lng or k out of range')
+
+    return JsonResponse({
+        'venues': venue_index.nearest(lat, lng, min(k, MAX_NEAREST)),
+    })
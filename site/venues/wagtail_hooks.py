@@ -0,0 +1,37 @@
+from wagtail.contrib.modeladmin.helpers import PermissionHelper
+from wagtail.contrib.modeladmin.options import ModelAdmin, modeladmin_register
+
+from venues.models import VenueJob
+
+
+class VenueJobPermissionHelper(PermissionHelper):
+    '''Jobs are made by publishing venue pages and run by the worker, so
+    editors can look at them but not add or change them.'''
+
+    def user_can_create(self, user):
+        return False
+
+    def user_can_edit_obj(self, user, obj):
+        return False
+
+
+class VenueJobModelAdmin(ModelAdmin):
+    '''Venue refresh queue in the Wagtail admin, so editors can see
+    whether a published venue has been refreshed and why it failed.'''
+    model = VenueJob
+    menu_label = 'Venue refreshes'
+    menu_icon = 'time'
+    menu_order = 900
+    add_to_settings_menu = False
+    permission_helper_class = VenueJobPermissionHelper
+    list_display = (
+        'venue_page', 'status', 'attempts', 'run_after', 'updated_at')
+    list_filter = ('status',)
+    search_fields = ('venue_page__title',)
+    inspect_view_enabled = True
+    inspect_view_fields = (
+        'venue_page', 'status', 'attempts', 'run_after', 'locked_at',
+        'created_at', 'updated_at', 'last_error')
+
+
+modeladmin_register(VenueJobModelAdmin)